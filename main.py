@@ -1,19 +1,33 @@
+import time
+
+# Cold start, the time to the first query is measured from here
+STARTED_AT = time.monotonic()
+
 import os
-import gi
+import threading
+import concurrent.futures
 from ulauncher.api.shared.action.ExtensionCustomAction import ExtensionCustomAction
-from gi.repository import Notify
 
-gi.require_version("Gdk", "3.0")
-gi.require_version("Notify", "0.7")
 from src.items import quick_capture_note, show_notes, create_note, select_note, cancel
 from src.functions import (
-    append_to_note_in_vault,
+    get_append_path,
     find_note_in_vault,
     find_string_in_vault,
+    find_backlinks_in_vault,
     create_note_in_vault,
     generate_daily_url,
+    get_periodic_paths,
     generate_url,
+    top_notes,
 )
+from src.index import IndexNotReady, VaultIndex
+from src.cancellation import SearchCancelled
+from src.querycache import QueryCache
+from src.watcher import VaultWatcher
+from src.snapshot import get_cache_dir, load_snapshot, save_snapshot
+from src.frecency import FrecencyStore
+from src.appendqueue import FSYNC_POLICIES, AppendQueue
+from src.notify import notify
 from ulauncher.api.client.Extension import Extension
 from ulauncher.api.client.EventListener import EventListener
 from ulauncher.api.shared.event import (
@@ -21,6 +35,7 @@ from ulauncher.api.shared.event import (
     ItemEnterEvent,
     SystemExitEvent,
 )
+from ulauncher.api.shared.item.ExtensionResultItem import ExtensionResultItem
 from ulauncher.api.shared.action.RenderResultListAction import RenderResultListAction
 from ulauncher.api.shared.action.OpenAction import OpenAction
 from ulauncher.api.shared.action.DoNothingAction import DoNothingAction
@@ -32,11 +47,43 @@ logger = logging.getLogger(__name__)
 
 
 class ObisidanExtension(Extension):
+    # Seconds a query waits for its vaults, slower vaults are left out of the results
+    QUERY_DEADLINE = 1.5
+    # Seconds the indexes are warmed after start, letting the extension register with Ulauncher first
+    WARM_UP_DELAY = 0.5
+    # Seconds warming up waits for the preferences, which Ulauncher sends once connected
+    PREFERENCES_TIMEOUT = 10
+
     def __init__(self):
         super(ObisidanExtension, self).__init__()
 
         self.state = "default"
         self.content = ""
+        # One long-lived note index per vault path, loaded or built in the background on first use
+        self.indexes = {}
+        self._indexes_lock = threading.Lock()
+        # Vaults are searched in parallel on this pool
+        self.executor = concurrent.futures.ThreadPoolExecutor(max_workers=8, thread_name_prefix="obsidian-search")
+        # Vaults the last search_vaults left out, as they were not indexed yet or too slow
+        self.dropped_vaults = []
+        # Content scans of vaults without a content index yet, created on first use
+        self.scan_executor = None
+        self._scan_executor_lock = threading.Lock()
+        # Queries run one at a time on this thread. Every KeywordQueryEvent increases
+        # query_generation, which makes the query that is still running stale.
+        self.query_executor = concurrent.futures.ThreadPoolExecutor(max_workers=1, thread_name_prefix="obsidian-query")
+        self.query_generation = 0
+        self.running_generation = 0
+        self.first_query_logged = False
+        # Results of recent queries, refined while the user keeps typing
+        self.query_cache = None
+        # Notes opened and appended to, ranked higher when searching notes by name
+        self.frecency = FrecencyStore(os.path.join(get_cache_dir(), "frecency.json"))
+        # Captures are written in the background, captures a crash interrupted are written now
+        self.append_queue = AppendQueue(os.path.join(get_cache_dir(), "append-journal.jsonl"))
+        # Applies file changes in the vaults to the indexes
+        self.watcher = VaultWatcher()
+        self.watcher.start()
         self.subscribe(KeywordQueryEvent, KeywordQueryEventListener())
         self.subscribe(ItemEnterEvent, ItemEnterEventListener())
         self.subscribe(SystemExitEvent, SystemExitEventListener())
@@ -45,6 +92,182 @@ class ObisidanExtension(Extension):
         self.state = "default"
         self.content = ""
 
+    def run(self):
+        # Connecting to Ulauncher blocks until the extension is stopped
+        threading.Thread(target=self.warm_up, name="obsidian-warm-up", daemon=True).start()
+        super(ObisidanExtension, self).run()
+
+    def warm_up(self):
+        """Loads the indexes of the configured vaults, so the first query does not have to."""
+        time.sleep(self.WARM_UP_DELAY)
+        deadline = time.monotonic() + self.PREFERENCES_TIMEOUT
+        while not self.preferences.get("obsidian_vaults") and time.monotonic() < deadline:
+            time.sleep(0.1)
+        vault_paths = [path.strip() for path in self.preferences.get("obsidian_vaults", "").split(",") if path.strip()]
+        for vault_path in vault_paths:
+            if not os.path.isdir(vault_path):
+                continue
+            try:
+                self.get_vault_index(vault_path)
+            except Exception as e:
+                logger.error(f"Error while warming the index of {vault_path}: {e}")
+
+    def trigger_event(self, event):
+        if isinstance(event, KeywordQueryEvent):
+            self.query_generation += 1
+            self.query_executor.submit(self.run_query, event, self.query_generation)
+        else:
+            super(ObisidanExtension, self).trigger_event(event)
+
+    def run_query(self, event, generation: int):
+        # Queries typed over while waiting in line are skipped entirely
+        if generation != self.query_generation:
+            return
+        self.running_generation = generation
+        started = time.monotonic()
+        try:
+            super(ObisidanExtension, self).trigger_event(event)
+        except SearchCancelled:
+            logger.debug(f"Dropped stale query '{event.get_argument()}'")
+        except Exception as e:
+            logger.error(f"Error while handling query '{event.get_argument()}': {e}")
+        if not self.first_query_logged:
+            self.first_query_logged = True
+            now = time.monotonic()
+            logger.info(
+                f"Time to first query: {(now - STARTED_AT) * 1000:.0f} ms since start, "
+                f"the query took {(now - started) * 1000:.0f} ms"
+            )
+
+    def query_cancelled(self) -> bool:
+        """Tells if the query being handled was superseded by a newer one."""
+        return self.running_generation != self.query_generation
+
+    def get_query_cache(self) -> QueryCache:
+        try:
+            max_bytes = int(float(self.preferences.get("query_cache_size", 16)) * 1024 * 1024)
+        except ValueError:
+            max_bytes = 16 * 1024 * 1024
+        if self.query_cache is None:
+            self.query_cache = QueryCache(max_bytes)
+        elif self.query_cache.max_bytes != max_bytes:
+            # The preference changed, entries beyond the new cap go on the next insert
+            self.query_cache.max_bytes = max_bytes
+        return self.query_cache
+
+    def queue_append(self, vault_path: str, file_name_or_path: str, content: str) -> str:
+        """
+        Queues content to be appended to a note, see get_append_path.
+        Returns the path of the note, which may not be written yet.
+        """
+        fsync_policy = self.preferences.get("append_fsync", "journal")
+        if fsync_policy in FSYNC_POLICIES:
+            self.append_queue.fsync_policy = fsync_policy
+        path = get_append_path(vault_path, file_name_or_path)
+        self.append_queue.append(path, content)
+        return path
+
+    def get_vault_index(self, vault_path: str) -> VaultIndex:
+        """
+        Returns the index of a vault. The first call starts loading or building
+        it in the background, meanwhile the index is not ready.
+        """
+        # Vaults are searched from several threads, make sure each is only built once
+        with self._indexes_lock:
+            index = self.indexes.get(vault_path)
+            if index is not None:
+                return index
+            index = self.indexes[vault_path] = VaultIndex(vault_path)
+        threading.Thread(target=self.open_index, args=(index,), name="obsidian-index", daemon=True).start()
+        return index
+
+    def get_ready_index(self, vault_path: str) -> VaultIndex:
+        """
+        Like get_vault_index, but raises IndexNotReady instead of returning an
+        index that is not ready, so searches never wait for a build.
+        """
+        index = self.get_vault_index(vault_path)
+        if not index.ready:
+            raise IndexNotReady(vault_path)
+        return index
+
+    def open_index(self, index: VaultIndex):
+        try:
+            restored = load_snapshot(index)
+            if not restored:
+                index.build()
+        except Exception as e:
+            logger.error(f"Error while building the index of {index.vault_path}: {e}")
+            # The next search tries again
+            with self._indexes_lock:
+                if self.indexes.get(index.vault_path) is index:
+                    del self.indexes[index.vault_path]
+            return
+        self.watcher.watch(index)
+        # Content searches scan the files until the content index is loaded
+        self.warm_index(index, restored)
+
+    def get_scan_executor(self) -> concurrent.futures.ProcessPoolExecutor:
+        # Vaults are searched from several threads, make sure only one pool is created
+        with self._scan_executor_lock:
+            if self.scan_executor is None:
+                import multiprocessing
+
+                # forkserver keeps the workers from inheriting the locks of our threads
+                self.scan_executor = concurrent.futures.ProcessPoolExecutor(
+                    mp_context=multiprocessing.get_context("forkserver")
+                )
+            return self.scan_executor
+
+    def search_vaults(self, vault_paths: list, search_vault) -> list:
+        """
+        Runs search_vault(vault_path) for all vaults in parallel and returns the
+        results in the order of vault_paths. Vaults that fail or do not answer
+        within QUERY_DEADLINE are left out. So are vaults whose index is not
+        ready yet, these and the slow ones are listed in dropped_vaults, as
+        their notes may still match. Raises SearchCancelled if a newer query
+        arrived meanwhile, so the stale results are never rendered.
+        """
+        futures = {self.executor.submit(search_vault, vault_path): vault_path for vault_path in vault_paths}
+        results = {}
+        self.dropped_vaults = []
+        try:
+            for future in concurrent.futures.as_completed(futures, timeout=self.QUERY_DEADLINE):
+                try:
+                    results[futures[future]] = future.result()
+                except SearchCancelled:
+                    pass
+                except IndexNotReady:
+                    logger.info(f"Leaving out {futures[future]}, its index is not ready yet")
+                    self.dropped_vaults.append(futures[future])
+                except Exception as e:
+                    logger.error(f"Error while searching {futures[future]}: {e}")
+        except concurrent.futures.TimeoutError:
+            for future, vault_path in futures.items():
+                if not future.done():
+                    logger.warning(f"Dropping results of {vault_path}, it took longer than {self.QUERY_DEADLINE}s")
+                    self.dropped_vaults.append(vault_path)
+        if self.query_cancelled():
+            raise SearchCancelled()
+        return [results[vault_path] for vault_path in vault_paths if vault_path in results]
+
+    def warm_index(self, index: VaultIndex, restored: bool):
+        try:
+            if restored:
+                # Only notes whose mtime or size changed since the snapshot are read again
+                index.refresh()
+            index.load_content()
+            save_snapshot(index)
+        except Exception as e:
+            logger.error(f"Error while indexing {index.vault_path}: {e}")
+
+    def save_indexes(self):
+        for index in list(self.indexes.values()):
+            try:
+                save_snapshot(index)
+            except Exception as e:
+                logger.error(f"Could not save index snapshot of {index.vault_path}: {e}")
+
 
 class ItemEnterEventListener(EventListener):
     def __init__(self):
@@ -68,6 +291,12 @@ class ItemEnterEventListener(EventListener):
             self.context_data = {} # Also clear context_data
             return SetUserQueryAction("")
 
+        # --- Open a note found by a search, recording the open for frecency ---
+        elif type == "open-note":
+            if data.get("path"):
+                extension.frecency.record(data["path"])
+            return OpenAction(data.get("url"))
+
         # --- Modified 'create-note' when in 'quick-capture-to-note' state ---
         elif type == "create-note" and extension.state == "quick-capture-to-note":
             # Data for create-note action now comes from src/items.py's create_note
@@ -80,8 +309,7 @@ class ItemEnterEventListener(EventListener):
 
             if not target_vault_path or not note_name_to_create or not content_to_append:
                 logger.error(f"Missing data for create-note with quick-capture: {data}, content: {content_to_append}")
-                Notify.init("Ulauncher Obsidian")
-                Notify.Notification.new("Obsidian Error", "Missing data to create/append note.", None).show()
+                notify("Obsidian Error", "Missing data to create/append note.")
                 extension.reset()
                 self.context_data = {}
                 return HideWindowAction()
@@ -91,20 +319,19 @@ class ItemEnterEventListener(EventListener):
                 created_note_full_path = create_note_in_vault(target_vault_path, note_name_to_create)
 
                 # 2. Append content to the newly created note
-                append_to_note_in_vault(target_vault_path, created_note_full_path, content_to_append)
+                extension.queue_append(target_vault_path, created_note_full_path, content_to_append)
+                extension.frecency.record(created_note_full_path)
 
                 # 3. Generate URL and open
                 url = generate_url(target_vault_name, created_note_full_path, target_vault_path)
 
-                Notify.init("Ulauncher Obsidian")
-                Notify.Notification.new("Obsidian Success", f"Created and appended to '{note_name_to_create}' in '{target_vault_name}' vault.", None).show()
+                notify("Obsidian Success", f"Created and appended to '{note_name_to_create}' in '{target_vault_name}' vault.")
                 extension.reset()
                 self.context_data = {}
                 return OpenAction(url)
             except Exception as e:
                 logger.error(f"Error creating/appending note in quick-capture-to-note state: {e}")
-                Notify.init("Ulauncher Obsidian")
-                Notify.Notification.new("Obsidian Error", f"Failed to create/append note: {e}", None).show()
+                notify("Obsidian Error", f"Failed to create/append note: {e}")
                 extension.reset()
                 self.context_data = {}
                 return HideWindowAction()
@@ -118,21 +345,18 @@ class ItemEnterEventListener(EventListener):
 
             if not target_vault_path or not note_name_to_create:
                 logger.error(f"Missing data for general create-note: {data}")
-                Notify.init("Ulauncher Obsidian")
-                Notify.Notification.new("Obsidian Error", "Missing data to create note.", None).show()
+                notify("Obsidian Error", "Missing data to create note.")
                 return HideWindowAction()
 
             try:
                 path = create_note_in_vault(target_vault_path, note_name_to_create)
                 url = generate_url(target_vault_name, path, target_vault_path) # Uses target_vault_name for URI
 
-                Notify.init("Ulauncher Obsidian")
-                Notify.Notification.new("Obsidian Success", f"Created note '{note_name_to_create}' in '{target_vault_name}' vault.", None).show()
+                notify("Obsidian Success", f"Created note '{note_name_to_create}' in '{target_vault_name}' vault.")
                 return OpenAction(url)
             except Exception as e:
                 logger.error(f"Error creating general note: {e}")
-                Notify.init("Ulauncher Obsidian")
-                Notify.Notification.new("Obsidian Error", f"Failed to create note: {e}", None).show()
+                notify("Obsidian Error", f"Failed to create note: {e}")
                 return HideWindowAction()
 
 
@@ -144,25 +368,23 @@ class ItemEnterEventListener(EventListener):
 
             if not target_vault_path or not content:
                 logger.error(f"Missing data for quick-capture: {data}")
-                Notify.init("Ulauncher Obsidian")
-                Notify.Notification.new("Obsidian Error", "Missing data for quick capture.", None).show()
+                notify("Obsidian Error", "Missing data for quick capture.")
                 return HideWindowAction()
 
             try:
                 # If obsidian_quick_capture_note is defined, use that filename. Otherwise, append to daily.
-                # append_to_note_in_vault handles if file_name_or_path is empty (goes to daily)
+                # get_append_path handles if file_name_or_path is empty (goes to daily)
                 quick_capture_note_filename = extension.preferences.get("obsidian_quick_capture_note", "").strip()
 
-                append_to_note_in_vault(target_vault_path, quick_capture_note_filename, content)
+                appended_path = extension.queue_append(target_vault_path, quick_capture_note_filename, content)
+                extension.frecency.record(appended_path)
 
-                Notify.init("Ulauncher Obsidian")
                 note_target_description = "daily note" if not quick_capture_note_filename else f"'{quick_capture_note_filename}'"
-                Notify.Notification.new("Obsidian Success", f"Appended to {note_target_description} in '{target_vault_name}' vault.", None).show()
+                notify("Obsidian Success", f"Appended to {note_target_description} in '{target_vault_name}' vault.")
                 return HideWindowAction()
             except Exception as e:
                 logger.error(f"Error during quick capture: {e}")
-                Notify.init("Ulauncher Obsidian")
-                Notify.Notification.new("Obsidian Error", f"Failed to quick capture: {e}", None).show()
+                notify("Obsidian Error", f"Failed to quick capture: {e}")
                 return HideWindowAction()
 
         # --- Modified 'quick-capture-to-note' (initial trigger) ---
@@ -182,8 +404,7 @@ class ItemEnterEventListener(EventListener):
 
             if not selected_note_data or not content_to_append:
                 logger.error(f"Missing data for select-note with quick-capture: {data}, content: {content_to_append}")
-                Notify.init("Ulauncher Obsidian")
-                Notify.Notification.new("Obsidian Error", "Missing data to append to selected note.", None).show()
+                notify("Obsidian Error", "Missing data to append to selected note.")
                 extension.reset()
                 self.context_data = {}
                 return HideWindowAction()
@@ -194,21 +415,20 @@ class ItemEnterEventListener(EventListener):
             full_vault_path = selected_note_data.get("full_vault_path")
 
             try:
-                # append_to_note_in_vault needs vault_path and the specific file_path within that vault
-                append_to_note_in_vault(full_vault_path, note_path, content_to_append)
+                # queue_append needs vault_path and the specific file_path within that vault
+                extension.queue_append(full_vault_path, note_path, content_to_append)
+                extension.frecency.record(note_path)
 
                 # Generate URL to open the selected note
                 url = generate_url(vault_name, note_path, full_vault_path)
 
-                Notify.init("Ulauncher Obsidian")
-                Notify.Notification.new("Obsidian Success", f"Appended to '{note_name}' in '{vault_name}' vault.", None).show()
+                notify("Obsidian Success", f"Appended to '{note_name}' in '{vault_name}' vault.")
                 extension.reset()
                 self.context_data = {} # Clear context after successful operation
                 return OpenAction(url)
             except Exception as e:
                 logger.error(f"Error appending to selected note: {e}")
-                Notify.init("Ulauncher Obsidian")
-                Notify.Notification.new("Obsidian Error", f"Failed to append to selected note: {e}", None).show()
+                notify("Obsidian Error", f"Failed to append to selected note: {e}")
                 extension.reset()
                 self.context_data = {}
                 return HideWindowAction()
@@ -248,6 +468,7 @@ class KeywordQueryEventListener(EventListener):
         keyword_search_string_vault = extension.preferences["obsidian_search_string_vault"]
         keyword_open_daily = extension.preferences["obsidian_open_daily"]
         keyword_quick_capture = extension.preferences["obsidian_quick_capture"]
+        keyword_backlinks = extension.preferences["obsidian_backlinks"]
         number_of_notes = int(extension.preferences.get("number_of_notes", 8))
 
         keyword = event.get_keyword()
@@ -257,14 +478,22 @@ class KeywordQueryEventListener(EventListener):
 
         # --- Quick Capture to Note (Step 2: User is searching for a note to append to) ---
         if extension.state == "quick-capture-to-note":
-            all_notes_for_selection = []
-            for vault_path in vault_paths:
-                # find_note_in_vault now takes vault_path directly
-                notes_in_vault = find_note_in_vault(vault_path, search)
-                all_notes_for_selection.extend(notes_in_vault)
-
-            # Sort the results (e.g., by name for consistency)
-            all_notes_for_selection.sort(key=lambda note: note.name.lower())
+            # Every vault returns its best matches, only the overall best are kept
+            all_notes_for_selection = top_notes(
+                extension.search_vaults(
+                    vault_paths,
+                    lambda vault_path: find_note_in_vault(
+                        vault_path,
+                        search,
+                        extension.get_ready_index(vault_path),
+                        number_of_notes,
+                        extension.query_cancelled,
+                        extension.get_query_cache(),
+                        extension.frecency,
+                    ),
+                ),
+                number_of_notes,
+            )
 
             items.extend(select_note(all_notes_for_selection, number_of_notes))
             items.extend(create_note(search, vault_paths)) # Offer to create a new note to append to
@@ -274,19 +503,27 @@ class KeywordQueryEventListener(EventListener):
 
         # --- Search Note by Name (keyword_search_note_vault) ---
         elif keyword == keyword_search_note_vault:
-            all_found_notes = []
-            for vault_path in vault_paths:
-                # find_note_in_vault returns Note objects which now have vault_name and full_vault_path
-                found_in_vault = find_note_in_vault(vault_path, search)
-                all_found_notes.extend(found_in_vault)
-
-            # Sort aggregated notes (e.g., by name)
-            all_found_notes.sort(key=lambda note: note.name.lower())
+            # find_note_in_vault returns the best scored Note objects of each vault
+            all_found_notes = top_notes(
+                extension.search_vaults(
+                    vault_paths,
+                    lambda vault_path: find_note_in_vault(
+                        vault_path,
+                        search,
+                        extension.get_ready_index(vault_path),
+                        number_of_notes,
+                        extension.query_cancelled,
+                        extension.get_query_cache(),
+                        extension.frecency,
+                    ),
+                ),
+                number_of_notes,
+            )
 
             items.extend(show_notes(all_found_notes, number_of_notes)) # show_notes no longer needs a separate 'vault' argument
 
-            # If no notes found, offer to create
-            if not all_found_notes and search:
+            # If no notes found, offer to create, unless a vault left out may have them
+            if not all_found_notes and search and not extension.dropped_vaults:
                 items.extend(create_note(search, vault_paths)) # Pass vault_paths for multi-vault creation
 
             items.extend(cancel())
@@ -295,40 +532,87 @@ class KeywordQueryEventListener(EventListener):
 
         # --- Search String in Note Content (keyword_search_string_vault) ---
         elif keyword == keyword_search_string_vault:
-            all_found_notes_by_string = []
-            for vault_path in vault_paths:
-                # find_string_in_vault returns Note objects with description as context
-                found_in_vault = find_string_in_vault(vault_path, search)
-                all_found_notes_by_string.extend(found_in_vault)
+            # find_string_in_vault returns Note objects with description as context,
+            # scored by relevance once the content of their vault is indexed
+            def find_string_in(vault_path):
+                index = extension.get_ready_index(vault_path)
+                # Only vaults whose content is not indexed yet scan their files on the pool
+                executor = None if index.content_ready else extension.get_scan_executor()
+                return find_string_in_vault(
+                    vault_path,
+                    search,
+                    index,
+                    executor,
+                    extension.query_cancelled,
+                    extension.get_query_cache(),
+                    number_of_notes,
+                )
 
-            # Sort aggregated notes
-            all_found_notes_by_string.sort(key=lambda note: note.name.lower())
+            all_found_notes_by_string = top_notes(extension.search_vaults(vault_paths, find_string_in), number_of_notes)
 
             items.extend(show_notes(all_found_notes_by_string, number_of_notes))
 
-            # If no notes found, offer to create a new one
-            if not all_found_notes_by_string and search:
+            # If no notes found, offer to create a new one, unless a vault left out may have them
+            if not all_found_notes_by_string and search and not extension.dropped_vaults:
                 items.extend(create_note(search, vault_paths)) # Pass vault_paths
 
             items.extend(cancel())
             return RenderResultListAction(items)
 
 
+        # --- List Backlinks of a Note (keyword_backlinks) ---
+        elif keyword == keyword_backlinks:
+            # find_backlinks_in_vault resolves the note by name in every vault and reads its links from the graph
+            all_backlinks = top_notes(
+                extension.search_vaults(
+                    vault_paths,
+                    lambda vault_path: find_backlinks_in_vault(
+                        vault_path,
+                        search,
+                        extension.get_ready_index(vault_path),
+                        extension.query_cancelled,
+                    ),
+                ),
+                number_of_notes,
+            )
+
+            items.extend(show_notes(all_backlinks, number_of_notes))
+            items.extend(cancel())
+            return RenderResultListAction(items)
+
+
         # --- Open Daily Note (keyword_open_daily) ---
         elif keyword == keyword_open_daily:
-            daily_note_options = []
-            for vault_path in vault_paths:
+            def daily_note_options_of(vault_path):
                 vault_name = os.path.basename(vault_path)
                 # generate_daily_url now requires vault_name and full_vault_path
-                daily_url = generate_daily_url(vault_name, vault_path) 
-                daily_note_options.append(
+                daily_url = generate_daily_url(vault_name, vault_path)
+                options = [
                     ExtensionResultItem(
                         icon='images/icon.png',
                         name=f"Open Daily Note ({vault_name})",
                         description=f"Opens today's daily note in the '{vault_name}' vault.",
                         on_enter=OpenAction(daily_url)
                     )
-                )
+                ]
+                # Weekly, monthly, ... notes of the periods enabled in the periodic notes plugin
+                for period_path in get_periodic_paths(vault_path):
+                    period_name = period_path.period.capitalize()
+                    options.append(
+                        ExtensionResultItem(
+                            icon='images/icon.png',
+                            name=f"Open {period_name} Note ({vault_name})",
+                            description=f"Opens the {period_path.period} note {period_path.date} in the '{vault_name}' vault.",
+                            on_enter=OpenAction(generate_daily_url(vault_name, vault_path, period_path)),
+                        )
+                    )
+                return options
+
+            daily_note_options = [
+                option
+                for options in extension.search_vaults(vault_paths, daily_note_options_of)
+                for option in options
+            ]
             # If there's only one vault, automatically open it. Otherwise, show options.
             if len(daily_note_options) == 1:
                 return RenderResultListAction(daily_note_options)
@@ -363,6 +647,16 @@ class KeywordQueryEventListener(EventListener):
 
 class SystemExitEventListener(EventListener):
     def on_event(self, event, extension):
+        # Pending captures are written before anything else
+        extension.append_queue.close()
+        extension.watcher.stop()
+        extension.query_executor.shutdown(wait=False, cancel_futures=True)
+        extension.executor.shutdown(wait=False)
+        if extension.scan_executor is not None:
+            extension.scan_executor.shutdown(wait=False, cancel_futures=True)
+        # Exiting does not wait for the snapshots. The thread is no daemon, so the
+        # interpreter still lets them finish unless the process is killed first.
+        threading.Thread(target=extension.save_indexes, name="obsidian-save").start()
         extension.reset()
 
 
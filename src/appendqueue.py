@@ -0,0 +1,213 @@
+import os
+import json
+import time
+import threading
+import logging
+from collections import OrderedDict
+from typing import Dict, List, Optional
+
+from .noteio import NoteBusyError, append_text
+from .notify import notify
+
+logger = logging.getLogger(__name__)
+
+# How the queue uses fsync: never, for the journal only, or for the journal and every note
+FSYNC_POLICIES = ("never", "journal", "always")
+# Seconds the writer waits for more captures before writing a batch
+COALESCE_DELAY = 0.2
+
+
+class AppendQueue:
+    """
+    Appends text to notes in the background, so a capture returns before the
+    note is written. Captures that arrive while a batch is pending are
+    grouped per note and written with a single open and write.
+
+    Every capture is first added to a journal, which is emptied once the
+    batch holding it was written. Captures left in the journal by a crash
+    are written when the queue starts again. A crash between writing a
+    note and emptying the journal can thus append a capture twice, but
+    never lose it. Captures that could not be written are moved to a
+    second file next to the journal, and the user is notified.
+
+    >>> import tempfile
+    >>> directory = tempfile.mkdtemp()
+    >>> queue = AppendQueue(os.path.join(directory, "journal.jsonl"))
+    >>> note = os.path.join(directory, "Note.md")
+    >>> queue.append(note, "first")
+    >>> queue.append(note, "second")
+    >>> queue.flush()
+    >>> open(note).read().split()
+    ['first', 'second']
+    >>> os.path.getsize(os.path.join(directory, "journal.jsonl"))
+    0
+    >>> queue.close()
+    """
+
+    def __init__(self, journal_path: Optional[str], fsync_policy: str = "journal") -> None:
+        self.journal_path = journal_path
+        # Captures that failed for another reason than a busy note end up here
+        self.failed_path = os.path.splitext(journal_path)[0] + "-failed.jsonl" if journal_path else None
+        self.fsync_policy = fsync_policy
+        # note path -> captures not written yet, in order
+        self._pending: Dict[str, List[str]] = OrderedDict()
+        self._lock = threading.Lock()
+        # Serializes writing batches between the writer thread and flush()
+        self._write_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._closed = False
+        self._replay()
+        self._thread = threading.Thread(target=self._run, name="obsidian-append", daemon=True)
+        self._thread.start()
+
+    def append(self, path: str, content: str) -> None:
+        """Queues content to be appended to the note at path, on a new line."""
+        with self._lock:
+            if self._closed:
+                raise RuntimeError("The append queue is closed")
+            self._journal([{"path": path, "content": content}])
+            self._pending.setdefault(path, []).append(content)
+        self._wakeup.set()
+
+    def flush(self) -> None:
+        """Writes every pending capture before returning."""
+        self._write_batch()
+
+    def close(self) -> None:
+        """Writes every pending capture and stops the writer thread."""
+        with self._lock:
+            self._closed = True
+        self._wakeup.set()
+        self._thread.join(timeout=5)
+        self.flush()
+
+    def __len__(self):
+        with self._lock:
+            return sum(len(captures) for captures in self._pending.values())
+
+    def _run(self) -> None:
+        while True:
+            self._wakeup.wait()
+            with self._lock:
+                if self._closed:
+                    return
+            # Give a burst of captures the chance to end up in the same batch
+            time.sleep(COALESCE_DELAY)
+            with self._lock:
+                # close() writes what is left, clearing its wakeup would leave it waiting for us
+                if self._closed:
+                    return
+                self._wakeup.clear()
+            try:
+                self._write_batch()
+            except Exception as e:
+                logger.error(f"Error while writing captures: {e}")
+
+    def _write_batch(self) -> None:
+        with self._write_lock:
+            with self._lock:
+                batch, self._pending = self._pending, OrderedDict()
+            if not batch:
+                return
+
+            busy = OrderedDict()
+            failed = []
+            for path, captures in batch.items():
+                try:
+                    self._write_note(path, captures)
+                except NoteBusyError as e:
+                    logger.warning(f"{e}, trying again with the next batch")
+                    busy[path] = captures
+                except Exception as e:
+                    logger.error(f"Could not append {len(captures)} capture(s) to {path}: {e}")
+                    failed.extend({"path": path, "content": content, "error": str(e)} for content in captures)
+                    notify("Obsidian Error", f"Failed to append to {os.path.basename(path)}: {e}")
+
+            if failed:
+                self._keep_failed(failed)
+
+            with self._lock:
+                # Captures of busy notes go before the ones that arrived meanwhile
+                for path, captures in self._pending.items():
+                    busy.setdefault(path, []).extend(captures)
+                self._pending = busy
+                if busy:
+                    self._wakeup.set()
+                # Only what arrived while the batch was written still needs the journal
+                self._rewrite_journal()
+
+    def _write_note(self, path: str, captures: List[str]) -> None:
+        logger.info(f"Appending {len(captures)} capture(s) to {path}")
+        text = "".join(os.linesep + content for content in captures)
+        append_text(path, text, fsync=self.fsync_policy == "always")
+
+    def _keep_failed(self, records: List[dict]) -> None:
+        if self.failed_path is None:
+            return
+        try:
+            with open(self.failed_path, "a", encoding="utf-8") as f:
+                for record in records:
+                    f.write(json.dumps(record) + "\n")
+                if self.fsync_policy != "never":
+                    f.flush()
+                    os.fsync(f.fileno())
+            logger.warning(f"Kept {len(records)} capture(s) that could not be written in {self.failed_path}")
+        except OSError as e:
+            logger.error(f"Could not keep failed captures in {self.failed_path}: {e}")
+
+    def _journal(self, records: List[dict]) -> None:
+        if self.journal_path is None:
+            return
+        os.makedirs(os.path.dirname(self.journal_path), exist_ok=True)
+        with open(self.journal_path, "a", encoding="utf-8") as f:
+            for record in records:
+                f.write(json.dumps(record) + "\n")
+            if self.fsync_policy != "never":
+                f.flush()
+                os.fsync(f.fileno())
+
+    def _rewrite_journal(self) -> None:
+        if self.journal_path is None:
+            return
+        records = [
+            {"path": path, "content": content} for path, captures in self._pending.items() for content in captures
+        ]
+        temporary_path = self.journal_path + ".tmp"
+        with open(temporary_path, "w", encoding="utf-8") as f:
+            for record in records:
+                f.write(json.dumps(record) + "\n")
+            if self.fsync_policy != "never":
+                f.flush()
+                os.fsync(f.fileno())
+        os.replace(temporary_path, self.journal_path)
+
+    def _replay(self) -> None:
+        if self.journal_path is None:
+            return
+        try:
+            with open(self.journal_path, "r", encoding="utf-8") as f:
+                lines = f.readlines()
+        except FileNotFoundError:
+            return
+        except Exception as e:
+            logger.warning(f"Could not read append journal {self.journal_path}: {e}")
+            return
+
+        replayed = 0
+        for line in lines:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                # The last line may have been cut by a crash
+                continue
+            self._pending.setdefault(record["path"], []).append(record["content"])
+            replayed += 1
+        if replayed:
+            logger.info(f"Replaying {replayed} capture(s) from {self.journal_path}")
+            self._wakeup.set()
+
+
+if __name__ == "__main__":
+    import doctest
+
+    doctest.testmod()
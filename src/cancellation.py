@@ -0,0 +1,41 @@
+from typing import Callable, Iterable, Iterator, Optional, TypeVar
+
+T = TypeVar("T")
+
+# How many items are processed between two calls of the cancelled callback
+CHECK_INTERVAL = 256
+
+
+class SearchCancelled(Exception):
+    """Raised inside a search once a newer query made its result obsolete."""
+
+
+def raise_if_cancelled(cancelled: Optional[Callable[[], bool]]) -> None:
+    if cancelled is not None and cancelled():
+        raise SearchCancelled()
+
+
+def check_cancelled(items: Iterable[T], cancelled: Optional[Callable[[], bool]]) -> Iterator[T]:
+    """
+    Yields the items, raising SearchCancelled as soon as cancelled() returns True.
+
+    >>> list(check_cancelled([1, 2, 3], None))
+    [1, 2, 3]
+    >>> list(check_cancelled([1, 2, 3], lambda: True))  # doctest: +IGNORE_EXCEPTION_DETAIL
+    Traceback (most recent call last):
+    ...
+    SearchCancelled
+    """
+    if cancelled is None:
+        yield from items
+        return
+    for i, item in enumerate(items):
+        if i % CHECK_INTERVAL == 0 and cancelled():
+            raise SearchCancelled()
+        yield item
+
+
+if __name__ == "__main__":
+    import doctest
+
+    doctest.testmod()
@@ -0,0 +1,197 @@
+import os
+import json
+import threading
+import logging
+import datetime
+from typing import Any, Dict, FrozenSet, List, Optional, Tuple
+
+from .moment import format_moment
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_DAILY_FORMAT = "YYYY-MM-DD"
+# Periods of the periodic notes plugin besides daily, with its default formats
+PERIOD_FORMATS = {
+    "weekly": "gggg-[W]ww",
+    "monthly": "YYYY-MM",
+    "quarterly": "YYYY-[Q]Q",
+    "yearly": "YYYY",
+}
+
+
+class DailySettings:
+    """The format and folder of daily notes, or of the notes of another period."""
+
+    format: str
+    folder: str
+    period: str
+
+    def __init__(self, format, folder, period="daily") -> None:
+        self.folder = folder
+        self.format = format
+        self.period = period
+
+    def note_name(self, date: Optional[datetime.date] = None) -> str:
+        """The name of the note of the period containing date (today by default), may contain folders."""
+        return format_moment(date or datetime.datetime.now(), self.format)
+
+
+class CachedJson:
+    """
+    A JSON file that is parsed again only when its mtime, size or inode
+    changed, so revalidating it costs a single stat. version increases
+    whenever the parsed value was replaced.
+    """
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self.version = 0
+        self._stamp: Optional[Tuple[int, int, int]] = None
+        self._value: Any = None
+        self._lock = threading.Lock()
+
+    def load(self) -> Any:
+        """Returns the parsed file, None if it is missing or unreadable."""
+        try:
+            stat = os.stat(self.path)
+            stamp = (stat.st_mtime_ns, stat.st_size, stat.st_ino)
+        except OSError:
+            stamp = None
+        with self._lock:
+            if stamp == self._stamp and self.version:
+                return self._value
+            value = None
+            if stamp is not None:
+                try:
+                    with open(self.path, "r", encoding="utf-8") as f:
+                        value = json.load(f)
+                except Exception as e:
+                    logger.warning(f"Could not read {self.path}: {e}")
+            self._stamp = stamp
+            self._value = value
+            self.version += 1
+            return value
+
+
+class VaultConfig:
+    """
+    The parts of a vault's .obsidian folder the extension reads, cached.
+    Derived values like the plugin list and the daily note settings are
+    only rebuilt when one of the files they come from changed.
+
+    >>> config = get_vault_config("test-vault")
+    >>> "periodic-notes" in config.plugins()
+    True
+    >>> settings = config.daily_settings()
+    >>> settings.format, settings.note_name(datetime.date(2021, 7, 16))
+    ('DD-MM-YYYY', '16-07-2021')
+    >>> config.daily_settings() is settings
+    True
+    >>> config.periodic_periods()
+    []
+    """
+
+    def __init__(self, vault_path: str) -> None:
+        self.vault_path = vault_path
+        obsidian = os.path.join(vault_path, ".obsidian")
+        self._core_plugins = CachedJson(os.path.join(obsidian, "core-plugins.json"))
+        self._community_plugins = CachedJson(os.path.join(obsidian, "community-plugins.json"))
+        self._daily_notes = CachedJson(os.path.join(obsidian, "daily-notes.json"))
+        self._periodic_notes = CachedJson(os.path.join(obsidian, "plugins", "periodic-notes", "data.json"))
+        # (key of the files a value was built from, value)
+        self._plugins: Tuple[Any, FrozenSet[str]] = (None, frozenset())
+        self._settings: Dict[str, Tuple[Any, DailySettings]] = {}
+
+    def plugins(self) -> FrozenSet[str]:
+        """The enabled core and community plugins."""
+        core = self._core_plugins.load()
+        community = self._community_plugins.load()
+        key = (self._core_plugins.version, self._community_plugins.version)
+        if self._plugins[0] != key:
+            self._plugins = (key, plugin_names(core) | plugin_names(community))
+        return self._plugins[1]
+
+    def is_plugin_enabled(self, name: str) -> bool:
+        return name in self.plugins()
+
+    def daily_notes_settings(self) -> DailySettings:
+        """The settings of the core daily notes plugin."""
+        return self._cached_settings("daily-notes", self._daily_notes, lambda config: config)
+
+    def periodic_settings(self, period: str = "daily") -> DailySettings:
+        """The settings of one period of the periodic notes plugin."""
+        return self._cached_settings(
+            f"periodic-notes-{period}", self._periodic_notes, lambda config: config.get(period), period
+        )
+
+    def periodic_periods(self) -> List[DailySettings]:
+        """The settings of the periods besides daily that have periodic notes enabled."""
+        if not self.is_plugin_enabled("periodic-notes"):
+            return []
+        config = self._periodic_notes.load()
+        if not isinstance(config, dict):
+            return []
+        return [
+            self.periodic_settings(period)
+            for period in PERIOD_FORMATS
+            if isinstance(config.get(period), dict) and config[period].get("enabled")
+        ]
+
+    def daily_settings(self) -> DailySettings:
+        """The settings of the plugin creating the daily notes of the vault."""
+        if self.is_plugin_enabled("periodic-notes"):
+            return self.periodic_settings()
+        return self.daily_notes_settings()
+
+    def _cached_settings(self, name: str, source: CachedJson, section, period: str = "daily") -> DailySettings:
+        config = source.load()
+        cached = self._settings.get(name)
+        if cached is not None and cached[0] == source.version:
+            return cached[1]
+        if not isinstance(config, dict):
+            config = {}
+        settings_config = section(config)
+        if not isinstance(settings_config, dict):
+            settings_config = {}
+        default_format = PERIOD_FORMATS.get(period, DEFAULT_DAILY_FORMAT)
+        settings = DailySettings(
+            settings_config.get("format") or default_format, settings_config.get("folder") or "", period
+        )
+        self._settings[name] = (source.version, settings)
+        return settings
+
+
+def plugin_names(plugins: Any) -> FrozenSet[str]:
+    """
+    Obsidian lists enabled plugins, newer versions map every core plugin
+    to whether it is enabled.
+
+    >>> sorted(plugin_names(["daily-notes", "templates"]))
+    ['daily-notes', 'templates']
+    >>> sorted(plugin_names({"daily-notes": True, "templates": False}))
+    ['daily-notes']
+    """
+    if isinstance(plugins, dict):
+        return frozenset(name for name, enabled in plugins.items() if enabled)
+    if isinstance(plugins, list):
+        return frozenset(name for name in plugins if isinstance(name, str))
+    return frozenset()
+
+
+_configs: Dict[str, VaultConfig] = {}
+_configs_lock = threading.Lock()
+
+
+def get_vault_config(vault_path: str) -> VaultConfig:
+    """Returns the config of a vault, shared by every caller."""
+    with _configs_lock:
+        config = _configs.get(vault_path)
+        if config is None:
+            config = _configs[vault_path] = VaultConfig(vault_path)
+        return config
+
+
+if __name__ == "__main__":
+    import doctest
+
+    doctest.testmod()
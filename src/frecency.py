@@ -0,0 +1,113 @@
+import os
+import json
+import math
+import time
+import threading
+import logging
+from typing import Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+# Days after which a recorded use counts half
+HALF_LIFE_DAYS = 14
+# Points added to a fuzzy score (at most 100) per doubling of the frecency
+FRECENCY_WEIGHT = 10.0
+MAX_BOOST = 30.0
+# Entries that decayed below this are dropped when the store is saved
+MIN_SCORE = 0.05
+MAX_ENTRIES = 5000
+
+
+class FrecencyStore:
+    """
+    Remembers how often and how recently notes were used, persisted as JSON.
+
+    Every use adds a weight to the score of a note, which halves every
+    HALF_LIFE_DAYS. Only the score and the time it was computed at are
+    stored, the decay is applied whenever it is read or updated.
+
+    >>> store = FrecencyStore(None)
+    >>> store.record("/vault/a.md", now=0)
+    >>> store.record("/vault/a.md", now=0)
+    >>> store.score("/vault/a.md", now=0)
+    2.0
+    >>> store.score("/vault/a.md", now=HALF_LIFE_DAYS * 86400)
+    1.0
+    >>> store.boost("/vault/b.md")
+    0.0
+    >>> store.boost("/vault/a.md", now=0) > 0
+    True
+    """
+
+    def __init__(self, path: Optional[str]) -> None:
+        self.path = path
+        # note path -> (score, time the score was computed at)
+        self._entries: Dict[str, tuple] = {}
+        self._lock = threading.Lock()
+        self._load()
+
+    def _load(self) -> None:
+        if self.path is None:
+            return
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                self._entries = {path: tuple(entry) for path, entry in json.load(f).items()}
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            logger.warning(f"Ignoring unreadable frecency store {self.path}: {e}")
+
+    def _save(self) -> None:
+        if self.path is None:
+            return
+        now = time.time()
+        entries = {path: entry for path, entry in self._entries.items() if self._decayed(entry, now) >= MIN_SCORE}
+        if len(entries) > MAX_ENTRIES:
+            best = sorted(entries, key=lambda path: self._decayed(entries[path], now), reverse=True)[:MAX_ENTRIES]
+            entries = {path: entries[path] for path in best}
+        self._entries = entries
+
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        temporary_path = self.path + ".tmp"
+        with open(temporary_path, "w", encoding="utf-8") as f:
+            json.dump(entries, f)
+        os.replace(temporary_path, self.path)
+
+    @staticmethod
+    def _decayed(entry: tuple, now: float) -> float:
+        score, updated = entry
+        return score * 0.5 ** ((now - updated) / (HALF_LIFE_DAYS * 86400))
+
+    def record(self, path: str, weight: float = 1.0, now: Optional[float] = None) -> None:
+        """Adds a use of a note and saves the store."""
+        if now is None:
+            now = time.time()
+        with self._lock:
+            entry = self._entries.get(path)
+            score = self._decayed(entry, now) if entry is not None else 0.0
+            self._entries[path] = (score + weight, now)
+            try:
+                self._save()
+            except Exception as e:
+                logger.warning(f"Could not save frecency store {self.path}: {e}")
+
+    def score(self, path: str, now: Optional[float] = None) -> float:
+        entry = self._entries.get(path)
+        if entry is None:
+            return 0.0
+        return self._decayed(entry, time.time() if now is None else now)
+
+    def boost(self, path: str, now: Optional[float] = None) -> float:
+        """The points added to the fuzzy score of a note. Grows logarithmically, so a few uses already count."""
+        if path not in self._entries:
+            return 0.0
+        return min(FRECENCY_WEIGHT * math.log2(1 + self.score(path, now)), MAX_BOOST)
+
+    def __len__(self):
+        return len(self._entries)
+
+
+if __name__ == "__main__":
+    import doctest
+
+    doctest.testmod()
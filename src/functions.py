@@ -1,54 +1,259 @@
 import os
-import glob
-import json
+import re
+import math
+import time
 import datetime
+import heapq
+import functools
+import itertools
+import concurrent.futures
 from urllib.parse import quote, urlencode
 from pathlib import Path
-from typing import List, Literal
+from typing import Any, Callable, Iterable, List, Literal, Optional, Tuple
 import logging
 from ulauncher.utils.fuzzy_search import get_score
 
-from .moment import convert_moment_to_strptime_format
+from .index import VaultIndex, char_mask, is_subsequence
+from .cancellation import check_cancelled
+from .querycache import QueryCache
+from .frecency import FrecencyStore
+from .scan import scan_vault_files
+from .walker import ExclusionRules, walk_vault
+from .snippets import Snippet, file_snippet
+from .config import DailySettings, get_vault_config
+from .noteio import append_text, create_note
 
 logger = logging.getLogger(__name__)
 
+# Points added to the fuzzy score of a note per doubling of its backlinks
+BACKLINK_WEIGHT = 5.0
+# Content scores grow by this fraction per doubling of the backlinks
+BACKLINK_CONTENT_WEIGHT = 0.1
+# Doublings of the backlinks counted at most
+MAX_CENTRALITY = 3.0
 
-def fuzzyfinder(search: str, items: List[str]) -> List[str]:
+
+def prefilter(
+    search: str,
+    items: Iterable,
+    match_key: Callable,
+    cancelled: Optional[Callable[[], bool]] = None,
+) -> list:
+    """
+    Drops the items whose name does not contain the characters of the search
+    in order, which get_score could only give a poor score anyway.
+    match_key returns the (lowercased name, char_mask) of an item, or a list
+    of such pairs for items known under several names.
+    SearchCancelled is raised once cancelled() returns True.
+
+    >>> prefilter("hl", ["hi", "hallo", "false"], lambda name: (name, char_mask(name)))
+    ['hallo']
+    >>> prefilter("hl", ["hi", "hu"], lambda name: [(name, char_mask(name)), ("hello", char_mask("hello"))])
+    ['hi', 'hu']
+    """
+    items = check_cancelled(items, cancelled)
+    search_lower = search.lower()
+    if not search_lower:
+        return list(items)
+    search_mask = char_mask(search_lower)
+
+    def name_matches(name_lower: str, name_mask: int) -> bool:
+        return name_mask & search_mask == search_mask and is_subsequence(search_lower, name_lower)
+
+    def could_match(item) -> bool:
+        key = match_key(item)
+        if isinstance(key, list):
+            return any(name_matches(*pair) for pair in key)
+        return name_matches(*key)
+
+    return list(filter(could_match, items))
+
+
+def rank(
+    search: str,
+    items: Iterable,
+    key: Callable,
+    limit: Optional[int] = None,
+    boost: Optional[Callable[[Any], float]] = None,
+    name: Optional[Callable[[Any], str]] = None,
+) -> List[Tuple[float, Any]]:
+    """
+    Scores every item and returns (score, item) pairs, best first.
+    With a limit only the best `limit` pairs are kept in a heap instead of
+    sorting all of them. Like top_notes, items with equal scores are listed
+    by name, which is key(item) unless a name function is given.
+    boost(item) is added to the score of every item.
+
+    >>> [item for _, item in rank("ha", ["hallo", "hat"], key=str, boost=lambda item: 50 * (item == "hallo"))]
+    ['hallo', 'hat']
+    >>> [item for _, item in rank("", ["hare", "ibis", "gnu"], key=str, limit=2)]
+    ['gnu', 'hare']
+    """
+    if name is None:
+        name = key
+    if boost is None:
+        scores = ((get_score(search, key(i)), i) for i in items)
+    else:
+        scores = ((get_score(search, key(i)) + boost(i), i) for i in items)
+
+    def rank_key(pair):
+        return -pair[0], name(pair[1]).lower()
+
+    if limit is None:
+        return sorted(scores, key=rank_key)
+    return heapq.nsmallest(limit, scores, key=rank_key)
+
+
+def fuzzyfinder_scored(
+    search: str,
+    items: Iterable,
+    key: Optional[Callable] = None,
+    limit: Optional[int] = None,
+    match_key: Optional[Callable] = None,
+    cancelled: Optional[Callable[[], bool]] = None,
+) -> List[Tuple[float, Any]]:
+    """
+    Prefilters and ranks items, returning the best (score, item) pairs.
+    match_key may return the precomputed (lowercased name, char_mask) of an
+    item to make the prefilter cheaper.
+
+    >>> [item for _, item in fuzzyfinder_scored("hl", ["hi", "hu", "hallo", "false"], limit=2)]
+    ['hallo']
+    """
+    if key is None:
+        key = get_name_from_path
+    if match_key is None:
+        def match_key(item):
+            name_lower = key(item).lower()
+            return name_lower, char_mask(name_lower)
+
+    return rank(search, prefilter(search, items, match_key, cancelled), key, limit)
+
+
+def fuzzyfinder(search: str, items: list, key: Optional[Callable] = None, limit: Optional[int] = None) -> list:
     """
     >>> fuzzyfinder("hallo", ["hi", "hu", "hallo", "false"])
-    ['hallo', 'false', 'hi', 'hu']
+    ['hallo']
+
+    >>> fuzzyfinder("h", ["hi", "hu", "hallo", "false"], limit=2)
+    ['hi', 'hu']
+    """
+    return [item for _, item in fuzzyfinder_scored(search, items, key, limit)]
+
+
+def entry_match_key(include_tags: bool = False) -> Callable:
+    """
+    The prefilter match_key of index entries. Entries with aliases (or tags,
+    if included) can match under any of their labels.
     """
-    scores = []
-    for i in items:
-        score = get_score(search, get_name_from_path(i))
-        scores.append((score, i))
+    def match_key(entry):
+        if not entry.aliases and not (include_tags and entry.tags):
+            return entry.name_lower, entry.name_mask
+        return [(label.lower(), char_mask(label.lower())) for label in entry.labels(include_tags)]
 
-    scores = sorted(scores, key=lambda score: score[0], reverse=True)
+    return match_key
 
-    return list(map(lambda score: score[1], scores))
+
+def best_label(search: str, entry, include_tags: bool = False) -> str:
+    """The label of an index entry that matches the search best, its name if it has no others."""
+    if not entry.aliases and not (include_tags and entry.tags):
+        return entry.name
+    return max(entry.labels(include_tags), key=lambda label: get_score(search, label))
+
+
+def centrality(backlink_count: int) -> float:
+    """
+    How central a note is in the link graph, growing with every doubling of
+    its backlinks so a few hub notes do not drown everything else.
+
+    >>> centrality(0), centrality(1), centrality(3), centrality(1000)
+    (0.0, 1.0, 2.0, 3.0)
+    """
+    return min(math.log2(1 + backlink_count), MAX_CENTRALITY)
+
+
+def top_notes(note_lists: Iterable[List["Note"]], limit: int) -> List["Note"]:
+    """
+    Merges the scored results of several vaults into the best `limit` notes.
+    Notes with equal scores are listed by name.
+    """
+    return heapq.nsmallest(
+        limit, itertools.chain.from_iterable(note_lists), key=lambda note: (-note.score, note.name.lower())
+    )
 
 
 class Note:
-    def __init__(self, name: str, path: str, description: str):
+    def __init__(
+        self,
+        name: str,
+        path: str,
+        description: Optional[str],
+        score: float = 0,
+        snippet: Optional[Callable[[], Snippet]] = None,
+    ):
         self.name = name
         self.path = path
-        self.description = description
+        self._description = description
+        self.score = score
+        # Builds the Snippet of a content match, only called for notes that are shown
+        self._snippet = snippet
+
+    @property
+    def snippet(self) -> Optional[Snippet]:
+        if callable(self._snippet):
+            self._snippet = self._snippet()
+        return self._snippet
+
+    @property
+    def heading(self) -> Optional[str]:
+        """The heading the (first) content match is under, None for name matches."""
+        snippet = self.snippet
+        return snippet.heading if snippet is not None else None
+
+    @property
+    def description(self) -> str:
+        if self._description is None:
+            snippet = self.snippet
+            self._description = snippet.describe() if snippet is not None else ""
+        return self._description
 
     def __repr__(self):
         return f"Note<{self.path}>"
 
 
-def generate_url(vault_name: str, file_full_path: str, full_vault_path: str, mode: Literal["open", "new"] = "open") -> str:
+def heading_anchor(heading: str) -> str:
+    """
+    Turns a heading title into the form Obsidian links to it with, which
+    drops the characters that have a meaning in links.
+
+    >>> heading_anchor("Next: [steps] | #2")
+    'Next steps 2'
+    """
+    return " ".join(re.sub(r"[#|^:\[\]\\]", " ", heading).split())
+
+
+def generate_url(
+    vault_name: str,
+    file_full_path: str,
+    full_vault_path: str,
+    mode: Literal["open", "new"] = "open",
+    heading: Optional[str] = None,
+) -> str:
     """
     Generates an Obsidian URL for a given file within a vault.
     vault_name: The display name of the vault (e.g., "MyVault")
     file_full_path: The absolute path to the markdown file.
     full_vault_path: The absolute path to the vault's root directory.
     mode: "open" or "new"
+    heading: Title of a heading in the file to scroll to.
+
+    >>> generate_url("Vault", "/vault/notes/Plan.md", "/vault", heading="Next: steps")
+    'obsidian://open?vault=Vault&file=notes%2FPlan.md%23Next%20steps'
     """
     # Ensure the file path ends with .md for Obsidian
     if not file_full_path.endswith(".md"):
         file_full_path += ".md"
+    anchor = "#" + heading_anchor(heading) if heading else ""
 
     # Calculate the path relative to the vault's root
     try:
@@ -64,7 +269,7 @@ def generate_url(vault_name: str, file_full_path: str, full_vault_path: str, mod
             "obsidian://"
             + mode
             + "?"
-            + urlencode({"vault": vault_name, "file": relative_file_str}, quote_via=quote)
+            + urlencode({"vault": vault_name, "file": relative_file_str + anchor}, quote_via=quote)
         )
     except ValueError:
         # Fallback for cases where file_full_path is not within full_vault_path
@@ -78,7 +283,7 @@ def generate_url(vault_name: str, file_full_path: str, full_vault_path: str, mod
             "obsidian://"
             + mode
             + "?"
-            + urlencode({"vault": vault_name, "file": file_name_for_url}, quote_via=quote)
+            + urlencode({"vault": vault_name, "file": file_name_for_url + anchor}, quote_via=quote)
         )
 
 class DailyPath:
@@ -86,108 +291,57 @@ class DailyPath:
     date: str
     folder: str
     exists: bool
+    period: str
 
-    def __init__(self, path, date, folder, exists) -> None:
+    def __init__(self, path, date, folder, exists, period="daily") -> None:
         self.path = path
         self.date = date
         self.folder = folder
         self.exists = exists
-
-
-class DailySettings:
-    format: str
-    folder: str
-
-    def __init__(self, format, folder) -> None:
-        self.folder = folder
-        self.format = format
+        self.period = period
 
 
 def get_daily_settings(vault_path: str) -> DailySettings: # Changed 'vault' to 'vault_path'
-    daily_notes_path = os.path.join(vault_path, ".obsidian", "daily-notes.json") # Use vault_path
-    # ... rest of function remains the same ...
-    try:
-        f = open(daily_notes_path, "r")
-        daily_notes_config = json.load(f)
-        f.close()
-    except:
-        daily_notes_config = {}
-    format = daily_notes_config.get("format", "YYYY-MM-DD")
-    folder = daily_notes_config.get("folder", "")
-
-    if format == "":
-        format = "YYYY-MM-DD"
-
-    return DailySettings(format, folder)
+    return get_vault_config(vault_path).daily_notes_settings()
 
 
 def get_periodic_settings(vault_path: str) -> DailySettings: # Changed 'vault' to 'vault_path'
-    periodic_path = os.path.join(
-        vault_path, ".obsidian", "plugins", "periodic-notes", "data.json" # Use vault_path
-    )
-    # ... rest of function remains the same ...
-    try:
-        f = open(periodic_path)
-        config = json.load(f)
-        f.close()
-    except:
-        config = {}
-
-    daily_config = config.get("daily", {})
-    format = daily_config.get("format", "YYYY-MM-DD")
-    folder = daily_config.get("folder", "")
-
-    if format == "":
-        format = "YYYY-MM-DD"
-
-    return DailySettings(format, folder)
+    return get_vault_config(vault_path).periodic_settings()
 
 
 def is_obsidian_plugin_enabled(vault_path: str, name: str) -> bool: # Changed 'vault' to 'vault_path'
-    core = os.path.join(vault_path, ".obsidian", "core-plugins.json") # Use vault_path
-    community = os.path.join(vault_path, ".obsidian", "community-plugins.json") # Use vault_path
-    # ... rest of function remains the same ...
-    plugins = []
-    try:
-        with open(core) as f:
-            core = json.load(f)
-            plugins += core
-    except:
-        pass
+    return get_vault_config(vault_path).is_plugin_enabled(name)
 
-    try:
-        with open(community) as f:
-            community = json.load(f)
-            plugins += community
-    except:
-        pass
 
-    return name in plugins
+def get_period_path(vault_path: str, settings: DailySettings, date: Optional[datetime.date] = None) -> DailyPath:
+    """The note of the period containing date (today by default), formats may put it in subfolders."""
+    name = settings.note_name(date)
+    path = os.path.join(vault_path, settings.folder, name + ".md")
+    exists = os.path.exists(path)
+
+    return DailyPath(path, name, settings.folder, exists, settings.period)
 
 
 def get_daily_path(vault_path: str) -> DailyPath: # Changed 'vault' to 'vault_path'
-    if is_obsidian_plugin_enabled(vault_path, "periodic-notes"): # Use vault_path
-        settings = get_periodic_settings(vault_path) # Use vault_path
-    else:
-        settings = get_daily_settings(vault_path) # Use vault_path
+    # The config files are parsed once and only stat-ed on later calls
+    return get_period_path(vault_path, get_vault_config(vault_path).daily_settings())
 
-    date = datetime.datetime.now().strftime(
-        convert_moment_to_strptime_format(settings.format)
-    )
-    path = os.path.join(vault_path, settings.folder, date + ".md") # Use vault_path
-    exists = os.path.exists(path)
 
-    return DailyPath(path, date, settings.folder, exists)
+def get_periodic_paths(vault_path: str) -> List[DailyPath]:
+    """The current weekly, monthly, quarterly and yearly notes, for the periods the vault has enabled."""
+    return [get_period_path(vault_path, settings) for settings in get_vault_config(vault_path).periodic_periods()]
 
 
-def generate_daily_url(vault_name: str, full_vault_path: str) -> str: # New parameters
+def generate_daily_url(vault_name: str, full_vault_path: str, daily_path_info: Optional[DailyPath] = None) -> str: # New parameters
     """
     Generates an Obsidian URL to open/create today's daily note in a specific vault.
     vault_name: The display name of the vault (e.g., "MyVault")
     full_vault_path: The absolute path to the vault's root directory.
+    daily_path_info: The note to open instead, e.g. one of get_periodic_paths.
     """
     # Pass full_vault_path to get_daily_path
-    daily_path_info = get_daily_path(full_vault_path)
+    if daily_path_info is None:
+        daily_path_info = get_daily_path(full_vault_path)
     mode = "new"
     if daily_path_info.exists:
         mode = "open"
@@ -215,90 +369,248 @@ def get_name_from_path(path: str, exclude_ext=True) -> str:
     return base
 
 
-def find_note_in_vault(vault_path: str, search: str) -> List[Note]: # Changed 'vault' to 'vault_path'
+def find_note_in_vault(
+    vault_path: str,
+    search: str,
+    index: Optional[VaultIndex] = None,
+    limit: Optional[int] = None,
+    cancelled: Optional[Callable[[], bool]] = None,
+    query_cache: Optional[QueryCache] = None,
+    frecency: Optional[FrecencyStore] = None,
+) -> List[Note]:
     """
     Searches for notes in a specific vault whose filenames match the search term.
     Returns a list of Note objects, each enriched with vault_name and full_vault_path.
+    If an index is given, the search runs against it instead of listing the vault.
+    With a limit, Note objects are only created for the best `limit` matches.
+    With a query cache, only the notes matching a previous shorter query are checked.
+    With a frecency store, notes used often and recently are ranked higher,
+    as are notes many others link to. Notes also match by the aliases in their frontmatter and, for searches
+    starting with #, by their tags.
     """
-    search_pattern = os.path.join(vault_path, "**", "*.md") # Use vault_path
-    logger.info(f"Searching in {vault_path} with pattern: {search_pattern}") # Added f-string for better logging
-    files = glob.glob(search_pattern, recursive=True)
-    suggestions = fuzzyfinder(search, files)
+    if index is None:
+        index = VaultIndex(vault_path)
+        index.build()
+
+    search_lower = search.lower()
+    generation = index.generation
+    candidates = None
+    if query_cache is not None:
+        # Notes the shorter query ruled out cannot match the longer one either
+        candidates = query_cache.find_prefix(vault_path, "name", search_lower, generation)
+    if candidates is None:
+        candidates = index.entries()
+
+    include_tags = search.startswith("#")
+    candidates = prefilter(search, candidates, entry_match_key(include_tags), cancelled)
+    if query_cache is not None:
+        query_cache.put(vault_path, "name", search_lower, generation, candidates)
+
+    now = time.time()
+
+    def boost(entry) -> float:
+        points = BACKLINK_WEIGHT * centrality(index.backlink_count(entry))
+        if frecency is not None:
+            points += frecency.boost(entry.path, now)
+        return points
+
+    suggestions = rank(
+        search,
+        candidates,
+        key=lambda entry: best_label(search, entry, include_tags),
+        limit=limit,
+        boost=boost,
+        name=lambda entry: entry.name,
+    )
 
     notes_with_vault_info = []
     vault_name = get_name_from_path(vault_path, exclude_ext=False) # Get the simple vault name
 
-    for s in suggestions:
-        note = Note(name=get_name_from_path(s), path=s, description=s)
+    for score, s in suggestions:
+        description = s.path
+        label = best_label(search, s, include_tags)
+        if label != s.name:
+            # Tell why a note matched that does not look like the search
+            description = f"Tag: {label}" if label.startswith("#") else f"Alias: {label}"
+        note = Note(name=s.name, path=s.path, description=description, score=score)
         note.vault_name = vault_name # Attach vault_name
         note.full_vault_path = vault_path # Attach full_vault_path
         notes_with_vault_info.append(note)
     return notes_with_vault_info
 
 
-def find_string_in_vault(vault_path: str, search: str) -> List[Note]: # Changed 'vault' to 'vault_path'
+def find_string_in_vault(
+    vault_path: str,
+    search: str,
+    index: Optional[VaultIndex] = None,
+    executor: Optional[concurrent.futures.ProcessPoolExecutor] = None,
+    cancelled: Optional[Callable[[], bool]] = None,
+    query_cache: Optional[QueryCache] = None,
+    limit: Optional[int] = None,
+) -> List[Note]:
     """
     Searches for notes in a specific vault containing the search term in their content.
     Returns a list of Note objects, each enriched with vault_name and full_vault_path.
+    Their descriptions list where the term matched and are only built once read.
+    Once the content of the given index is loaded, the notes holding every token of
+    the search are scored by relevance (BM25) and their backlinks and checked against
+    the index in that order, without reading any file, otherwise they all score 0. Until then the files are
+    scanned, sharded across the executor's processes if one is given.
+    With a query cache, only the notes matching a previous shorter query are checked.
+    With a limit only the best `limit` matches, ranked like top_notes does, become notes.
     """
-    files = glob.glob(os.path.join(vault_path, "**", "*.md"), recursive=True) # Use vault_path
-
-    suggestions = []
-    CONTEXT_SIZE = 50 # Increased context size for better preview
-
-    search_lower = search.lower() # Do lowercasing once
     vault_name = get_name_from_path(vault_path, exclude_ext=False) # Get the simple vault name
-
+    search_lower = search.lower()
+    if index is None or not index.ready:
+        # Without an index there is no generation telling when cached results are outdated
+        query_cache = None
+
+    if index is not None and index.content_ready:
+        generation = index.generation
+        candidates = None
+        if query_cache is not None:
+            candidates = query_cache.find_prefix(vault_path, "content", search_lower, generation)
+        candidates, contains = index.content_candidates(search, candidates)
+
+        scores = (
+            (score * (1 + BACKLINK_CONTENT_WEIGHT * centrality(index.backlink_count(entry))), entry)
+            for entry, score in zip(candidates, index.bm25_scores(search, candidates))
+        )
+        def rank_key(pair):
+            # Like top_notes, equal scores are listed by name
+            return -pair[0], pair[1].name_lower
+
+        if contains is None:
+            ranked = heapq.nsmallest(limit, scores, key=rank_key) if limit is not None else sorted(scores, key=rank_key)
+            matches = candidates
+        else:
+            # Candidates are only checked until enough of them turned out to match
+            ordered = sorted(scores, key=rank_key)
+            ranked, checked = [], 0
+            for pair in check_cancelled(ordered, cancelled):
+                checked += 1
+                if contains(pair[1]):
+                    ranked.append(pair)
+                    if limit is not None and len(ranked) >= limit:
+                        break
+            # The candidates left unchecked may still match a longer query
+            matches = [entry for _, entry in ranked] + [entry for _, entry in ordered[checked:]]
+        if query_cache is not None:
+            query_cache.put(vault_path, "content", search_lower, generation, matches)
+        suggestions = []
+        for score, entry in ranked:
+            note = Note(
+                name=entry.name,
+                path=entry.path,
+                description=None,
+                score=score,
+                # Indexed notes know their headings, no need to look for them in the file
+                snippet=functools.partial(
+                    file_snippet, entry.path, search_lower, entry.outline if entry.doc_id is not None else None
+                ),
+            )
+            note.vault_name = vault_name
+            note.full_vault_path = vault_path
+            suggestions.append(note)
+        return suggestions
+
+    files = None
+    if query_cache is not None:
+        generation = index.generation
+        files = query_cache.find_prefix(vault_path, "scan", search_lower, generation)
+    if files is None:
+        if index is not None and index.ready:
+            files = [entry.path for entry in index.entries()]
+        else:
+            files = [record.path for record in walk_vault(vault_path, ExclusionRules.load(vault_path))]
+
+    results = scan_vault_files(files, search, executor, cancelled)
+    if query_cache is not None:
+        query_cache.put(vault_path, "scan", search_lower, generation, [file for file, _ in results])
+
+    files = [file for file, _ in results]
+    if limit is not None:
+        # Unranked matches all score 0, top_notes would list them by name
+        files = heapq.nsmallest(limit, files, key=lambda file: get_name_from_path(file).lower())
+    suggestions = []
     for file in files:
-        if os.path.isfile(file):
-            try:
-                with open(file, "r", encoding="utf-8") as f: # Specify encoding
-                    content = f.read()
-                    if search_lower in content.lower():
-                        # Find the first occurrence and get context
-                        match_index = content.lower().find(search_lower)
-                        start = max(0, match_index - CONTEXT_SIZE)
-                        end = min(len(content), match_index + len(search_lower) + CONTEXT_SIZE)
-
-                        # Add ellipses if content is truncated
-                        preview_text = content[start:end].strip()
-                        if start > 0:
-                            preview_text = "..." + preview_text
-                        if end < len(content):
-                            preview_text += "..."
-
-                        note = Note(
-                            name=get_name_from_path(file),
-                            path=file,
-                            description=preview_text,
-                        )
-                        note.vault_name = vault_name # Attach vault_name
-                        note.full_vault_path = vault_path # Attach full_vault_path
-                        suggestions.append(note)
-                        # Only add once per file, even if multiple matches
-                        break 
-            except Exception as e:
-                logger.warning(f"Could not read file {file} for content search: {e}")
-                pass # Continue to next file
+        note = Note(
+            name=get_name_from_path(file),
+            path=file,
+            description=None,
+            snippet=functools.partial(file_snippet, file, search_lower),
+        )
+        note.vault_name = vault_name # Attach vault_name
+        note.full_vault_path = vault_path # Attach full_vault_path
+        suggestions.append(note)
 
     return suggestions
 
+def find_backlinks_in_vault(
+    vault_path: str,
+    search: str,
+    index: Optional[VaultIndex] = None,
+    cancelled: Optional[Callable[[], bool]] = None,
+) -> List[Note]:
+    """
+    Lists the notes of a vault that link to or embed the note whose name
+    matches the search best. Returns Note objects enriched with vault_name
+    and full_vault_path, scored by how well the linked note matched.
+    The links come from the link graph of the index. Until its content is
+    loaded, the files are scanned for "[[name" instead.
+    """
+    if not search.strip():
+        return []
+    if index is None:
+        index = VaultIndex(vault_path)
+        index.build()
+        index.load_content()
+
+    targets = find_note_in_vault(vault_path, search, index, 1, cancelled)
+    target = index.get(targets[0].path) if targets else None
+    if target is None:
+        return []
+
+    if index.content_ready:
+        sources = index.backlinks(target)
+    else:
+        files = [entry.path for entry in index.entries() if entry.path != target.path]
+        results = scan_vault_files(files, "[[" + target.name, cancelled=cancelled)
+        sources = [entry for entry in map(index.get, (file for file, _ in results)) if entry is not None]
+
+    vault_name = get_name_from_path(vault_path, exclude_ext=False)
+    backlinks = []
+    for source in sources:
+        note = Note(
+            name=source.name,
+            path=source.path,
+            description=f"Links to {target.name}",
+            score=targets[0].score + BACKLINK_WEIGHT * centrality(index.backlink_count(source)),
+        )
+        note.vault_name = vault_name
+        note.full_vault_path = vault_path
+        backlinks.append(note)
+    return backlinks
+
+
 def create_note_in_vault(vault_path: str, name: str) -> str: # Changed 'vault' to 'vault_path'
     path = os.path.join(vault_path, name + ".md") # Use vault_path
-    if not os.path.isfile(path):
-        with open(path, "w", encoding="utf-8") as f: # Added encoding
-            f.write(f"# {name}")
+    # Never overwrites a note, even one created since the user typed the name
+    create_note(path, f"# {name}")
     return path
 
 
 
-def append_to_note_in_vault(vault_path: str, file_name_or_path: str, content: str): # New parameters names
+def get_append_path(vault_path: str, file_name_or_path: str) -> str:
     """
-    Appends content to a specific note file within a vault.
+    Resolves the note append_to_note_in_vault writes to.
     vault_path: The absolute path to the vault.
     file_name_or_path: Can be a filename (e.g., "Daily Note.md") or a full absolute path.
                        If it's just a filename, it's assumed to be in the vault's root.
-    content: The text to append.
+                       If it's empty, the daily note of the vault is used.
+
+    >>> get_append_path("/vault", "Inbox")
+    '/vault/Inbox.md'
     """
     final_file_path = file_name_or_path
 
@@ -315,13 +627,21 @@ def append_to_note_in_vault(vault_path: str, file_name_or_path: str, content: st
     if not file_name_or_path.strip(): # Handles empty string
         daily_path_info = get_daily_path(vault_path)
         final_file_path = daily_path_info.path
+    return final_file_path
 
 
+def append_to_note_in_vault(vault_path: str, file_name_or_path: str, content: str): # New parameters names
+    """
+    Appends content to a specific note file within a vault, see get_append_path.
+    content: The text to append.
+    Returns the path of the note that was appended to.
+    """
+    final_file_path = get_append_path(vault_path, file_name_or_path)
+
     logger.info(f"Appending to note: {final_file_path} in vault: {vault_path}")
 
-    with open(final_file_path, "a", encoding="utf-8") as f: # Added encoding
-        f.write(os.linesep) # Add a newline before appending
-        f.write(content)
+    append_text(final_file_path, os.linesep + content) # Add a newline before appending
+    return final_file_path
 
 
 
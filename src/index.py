@@ -0,0 +1,1100 @@
+import os
+import re
+import functools
+import math
+import bisect
+import threading
+import logging
+from array import array
+from collections import Counter
+from itertools import compress
+from typing import Callable, Dict, FrozenSet, Iterable, List, Optional, Set, Tuple
+
+from .cancellation import check_cancelled
+from .walker import ExclusionRules, NoteRecord, is_note_path, walk_vault
+
+logger = logging.getLogger(__name__)
+
+TOKEN_PATTERN = re.compile(r"\w+")
+# Type of the arrays of token ids
+TOKEN_TYPECODE = "I"
+# Splits a text into separators and tokens, the separators at even and the tokens at odd indices
+TOKEN_SPLIT_PATTERN = re.compile(r"(\w+)")
+HEADING_PATTERN = re.compile(r"^#{1,6}[ \t]+(.+?)[ \t#]*$", re.MULTILINE)
+# Fenced code blocks, whose lines starting with # are no headings
+FENCE_PATTERN = re.compile(r"^(```|~~~).*?(?:^\1|\Z)", re.MULTILINE | re.DOTALL)
+FRONTMATTER_KEY_PATTERN = re.compile(r"^(aliases|alias|tags|tag)[ \t]*:[ \t]*(.*)$")
+FRONTMATTER_ITEM_PATTERN = re.compile(r"^[ \t]+-[ \t]*(.*)$")
+# [[Target]], [[Target#Heading|Label]] and embeds like ![[Target]]
+WIKILINK_PATTERN = re.compile(r"!?\[\[([^\]|#^\n]*)[^\]\n]*\]\]")
+# Bytes read from the start of a note to find its frontmatter
+FRONTMATTER_HEAD_SIZE = 4096
+# Note ids of removed or re-indexed notes stay in the postings until they
+# outnumber this fraction of the indexed notes, then the postings are rebuilt
+COMPACT_RATIO = 0.25
+
+# BM25 parameters, see https://en.wikipedia.org/wiki/Okapi_BM25
+BM25_K1 = 1.2
+BM25_B = 0.75
+# Added, scaled by the term's idf, when a query term is part of the note name or of a heading
+TITLE_BOOST = 2.0
+HEADING_BOOST = 1.0
+
+
+def tokenize(text: str) -> List[str]:
+    """
+    >>> tokenize("Hello, World! hello_there 42")
+    ['hello', 'world', 'hello_there', '42']
+    """
+    return TOKEN_PATTERN.findall(text.lower())
+
+
+def char_mask(text: str) -> int:
+    """
+    A 64 bit fingerprint of the characters in a text. If a query has a bit
+    the text lacks, the text cannot contain all characters of the query.
+
+    >>> char_mask("ab") == char_mask("ba") == char_mask("abab")
+    True
+    >>> char_mask("abc") & char_mask("ab") == char_mask("ab")
+    True
+    """
+    mask = 0
+    for c in text:
+        mask |= 1 << (ord(c) & 63)
+    return mask
+
+
+def is_subsequence(query: str, text: str) -> bool:
+    """
+    >>> is_subsequence("hlo", "hallo")
+    True
+    >>> is_subsequence("olh", "hallo")
+    False
+    """
+    remaining = iter(text)
+    return all(c in remaining for c in query)
+
+
+def outline(text: str) -> Tuple[Tuple[int, str], ...]:
+    """
+    Returns the (line number, title) of every markdown heading of a text, in
+    order. Lines in fenced code blocks and #tags are no headings.
+
+    >>> outline("# Project plan\\nSome text\\n```\\n# comment\\n```\\n## Next steps ##\\n#tag")
+    ((1, 'Project plan'), (6, 'Next steps'))
+    """
+    fences = [match.span() for match in FENCE_PATTERN.finditer(text)] if "```" in text or "~~~" in text else []
+    headings = []
+    line = 1
+    previous = 0
+    for match in HEADING_PATTERN.finditer(text):
+        offset = match.start()
+        if any(start <= offset < end for start, end in fences):
+            continue
+        line += text.count("\n", previous, offset)
+        previous = offset
+        headings.append((line, match.group(1)))
+    return tuple(headings)
+
+
+def enclosing_heading(headings: Tuple[Tuple[int, str], ...], line: int) -> Optional[str]:
+    """
+    Returns the title of the last heading on or above a line.
+
+    >>> headings = outline("Intro\\n# First\\ntext\\n# Second\\ntext")
+    >>> enclosing_heading(headings, 1), enclosing_heading(headings, 3), enclosing_heading(headings, 5)
+    (None, 'First', 'Second')
+    """
+    position = bisect.bisect_right(headings, (line, chr(0x10FFFF)))
+    return headings[position - 1][1] if position else None
+
+
+def heading_terms(headings: Tuple[Tuple[int, str], ...]) -> FrozenSet[str]:
+    """
+    >>> sorted(heading_terms(outline("# Project plan\\n## Next steps")))
+    ['next', 'plan', 'project', 'steps']
+    """
+    return frozenset(tokenize(" ".join(title for _, title in headings)))
+
+
+def parse_frontmatter(head: str) -> Tuple[Tuple[str, ...], Tuple[str, ...]]:
+    """
+    Returns the (aliases, tags) of the YAML frontmatter at the start of a
+    note. Only the inline and block list forms Obsidian writes are
+    understood, frontmatter not closed within the head is ignored.
+
+    >>> parse_frontmatter("---\\naliases: [Plan, 'Roadmap']\\ntags:\\n  - work\\n  - \\"#project\\"\\n---\\nText")
+    (('Plan', 'Roadmap'), ('work', 'project'))
+    >>> parse_frontmatter("---\\nalias: Plan B\\ntags: work project\\n---\\n")
+    (('Plan B',), ('work', 'project'))
+    >>> parse_frontmatter("No frontmatter\\naliases: [Plan]")
+    ((), ())
+    """
+    lines = head.splitlines()
+    if not lines or lines[0].rstrip() != "---":
+        return (), ()
+
+    values: Dict[str, List[str]] = {"aliases": [], "tags": []}
+    key = None
+    for line in lines[1:]:
+        if line.rstrip() in ("---", "..."):
+            break
+        item = FRONTMATTER_ITEM_PATTERN.match(line)
+        if item is not None:
+            if key is not None:
+                values[key].append(item.group(1))
+            continue
+        match = FRONTMATTER_KEY_PATTERN.match(line)
+        if match is None:
+            key = None
+            continue
+        key = "aliases" if match.group(1).startswith("alias") else "tags"
+        value = match.group(2).strip()
+        if value.startswith("[") and value.endswith("]"):
+            values[key].extend(value[1:-1].split(","))
+        elif key == "tags":
+            values[key].extend(re.split(r"[,\s]+", value))
+        elif value:
+            values[key].extend(value.split(","))
+    else:
+        # Not closed within the head, it may have been cut anywhere
+        return (), ()
+
+    aliases = tuple(filter(None, (value.strip().strip("'\"") for value in values["aliases"])))
+    tags = tuple(filter(None, (value.strip().strip("'\"").lstrip("#") for value in values["tags"])))
+    return aliases, tags
+
+
+def read_frontmatter(path: str) -> Tuple[Tuple[str, ...], Tuple[str, ...]]:
+    """Reads only the head of a note and returns the (aliases, tags) of its frontmatter."""
+    try:
+        with open(path, "rb") as f:
+            head = f.read(FRONTMATTER_HEAD_SIZE)
+    except OSError:
+        return (), ()
+    if not head.startswith(b"---"):
+        return (), ()
+    return parse_frontmatter(head.decode("utf-8", "ignore"))
+
+
+def wikilinks(text: str) -> FrozenSet[str]:
+    """
+    Returns the lowercased names of the notes a text links to or embeds.
+    Like Obsidian, links are resolved by note name, folders are ignored.
+    Links to attachments and to headings of the note itself are left out.
+
+    >>> sorted(wikilinks("See [[Project Plan|plan]], ![[Diagram.png]], ![[folder/Other.md#Intro]] and [[#Local]]"))
+    ['other', 'project plan']
+    >>> sorted(wikilinks("[[Meeting 2021.07.16]]"))
+    ['meeting 2021.07.16']
+    """
+    names = set()
+    for target in WIKILINK_PATTERN.findall(text):
+        name = target.strip().rsplit("/", 1)[-1]
+        root, extension = os.path.splitext(name)
+        if extension.lower() == ".md":
+            name = root
+        elif extension[1:].isalpha():
+            # An attachment like image.png, while names like "Meeting 2021.07.16" are notes
+            continue
+        if name:
+            names.add(name.lower())
+    return frozenset(names)
+
+
+def trigrams(text: str) -> Set[str]:
+    """
+    >>> sorted(trigrams("Hallo"))
+    ['all', 'hal', 'llo']
+    """
+    text = text.lower()
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+def read_note(path: str) -> Optional[str]:
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return f.read()
+    except Exception as e:
+        logger.warning(f"Could not read file {path} for content search: {e}")
+        return None
+
+
+def split_array(values: array, ends: Iterable[int]) -> List[array]:
+    """
+    Cuts an array into the pieces ending at the given offsets.
+
+    >>> split_array(array("I", [1, 2, 3]), [1, 1, 3])
+    [array('I', [1]), array('I'), array('I', [2, 3])]
+    """
+    pieces, start = [], 0
+    for end in ends:
+        pieces.append(values[start:end])
+        start = end
+    return pieces
+
+
+def token_positions(data: bytes, token_id: int) -> List[int]:
+    """
+    Returns the positions of a token id in the bytes of an array of token
+    ids, which is much faster than comparing the ids one by one.
+
+    >>> data = array(TOKEN_TYPECODE, [7, 3, 7, 0x0300]).tobytes()
+    >>> token_positions(data, 7), token_positions(data, 3), token_positions(data, 5)
+    ([0, 2], [1], [])
+    """
+    pattern = array(TOKEN_TYPECODE, [token_id]).tobytes()
+    size = len(pattern)
+    positions = []
+    offset = data.find(pattern)
+    while offset >= 0:
+        if offset % size:
+            # The bytes straddle two ids
+            offset = data.find(pattern, offset + 1)
+            continue
+        positions.append(offset // size)
+        offset = data.find(pattern, offset + size)
+    return positions
+
+
+class IndexNotReady(Exception):
+    """Raised instead of waiting for the index of a vault that is still being loaded or built."""
+
+
+class NoteEntry:
+    """
+    A single markdown file known to a vault index.
+    The name fields are computed once when the file is added so that
+    searching never has to touch the path string again. Aliases and tags
+    come from the frontmatter, which from_disk reads along with the stamp.
+    doc_id, length, tokens, separators, outline, headings and links are only
+    filled once the content of the note is indexed. The text itself is never kept.
+    """
+
+    __slots__ = (
+        "path",
+        "basename",
+        "name",
+        "name_lower",
+        "name_mask",
+        "mtime_ns",
+        "size",
+        "doc_id",
+        "length",
+        "tokens",
+        "separators",
+        "outline",
+        "headings",
+        "aliases",
+        "tags",
+        "links",
+    )
+
+    def __init__(self, path: str, mtime_ns: int = 0, size: int = 0) -> None:
+        self.path = path
+        self.basename = os.path.basename(path)
+        self.name = os.path.splitext(self.basename)[0]
+        self.name_lower = self.name.lower()
+        self.name_mask = char_mask(self.name_lower)
+        self.mtime_ns = mtime_ns
+        self.size = size
+        # Id of the note in the postings, None until its content is indexed
+        self.doc_id: Optional[int] = None
+        # Number of tokens in the text, and their ids in order
+        self.length = 0
+        self.tokens = array(TOKEN_TYPECODE)
+        # (position, separator id) pairs of the separators that are no single
+        # space, the position being the one of the token they precede
+        self.separators = array("I")
+        # (line number, title) of the markdown headings of the text
+        self.outline: Tuple[Tuple[int, str], ...] = ()
+        # Tokens appearing in the markdown headings of the text
+        self.headings: FrozenSet[str] = frozenset()
+        self.aliases: Tuple[str, ...] = ()
+        self.tags: Tuple[str, ...] = ()
+        # Lowercased names of the notes the text links to
+        self.links: FrozenSet[str] = frozenset()
+
+    @classmethod
+    def from_disk(cls, path: str) -> "NoteEntry":
+        """Creates an entry stamped with the file's current mtime and size, with its frontmatter."""
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return cls(path)
+        return cls.from_record(NoteRecord(path, stat.st_size, stat.st_mtime_ns))
+
+    @classmethod
+    def from_record(cls, record: NoteRecord) -> "NoteEntry":
+        """Like from_disk, with the stamp a vault walk already collected."""
+        entry = cls(record.path, record.mtime_ns, record.size)
+        entry.aliases, entry.tags = read_frontmatter(record.path)
+        return entry
+
+    def labels(self, include_tags: bool = False) -> List[str]:
+        """
+        The strings a name search matches against: the name, the aliases and,
+        if asked for, the tags written as #tag.
+        """
+        labels = [self.name, *self.aliases]
+        if include_tags:
+            labels.extend("#" + tag for tag in self.tags)
+        return labels
+
+    def __repr__(self):
+        return f"NoteEntry<{self.path}>"
+
+
+class Phrase:
+    """
+    A content search of several tokens, or of a token with separators around
+    it, prepared against the vocabulary of an index: the ids of the tokens
+    every token of the search can be (its expansion), and the separators
+    expected around them. A note is searched for where a separator that
+    cannot be a single space is, or else for the tokens of the anchor, the
+    expansion in the fewest notes, before the rest is looked up.
+    """
+
+    __slots__ = ("search_lower", "vocabulary", "expansions", "anchor", "separators", "fixed")
+
+    def __init__(
+        self,
+        search_lower: str,
+        vocabulary: List[str],
+        expansions: List[Set[int]],
+        anchor: int,
+        separators: List[str],
+        fixed: List[Tuple[int, Set[int]]],
+    ) -> None:
+        self.search_lower = search_lower
+        # The vocabulary the token ids refer to, compacting the index replaces it
+        self.vocabulary = vocabulary
+        self.expansions = expansions
+        self.anchor = anchor
+        self.separators = separators
+        # (index, separator ids) of the separators that cannot be a single space
+        self.fixed = fixed
+
+
+class VaultIndex:
+    """
+    In-memory index of the notes of one vault.
+
+    The note list is built synchronously by build(). The inverted index over
+    the tokens of the notes is built separately by load_content(), along
+    with the graph of wikilinks between the notes. This is slow on large
+    vaults and meant to run in the background. Until content_ready is set,
+    content searches have to scan the files themselves.
+
+    Notes with indexed content get an integer id. Every token maps to a
+    flat array of (note id, occurrences) pairs, ascending by note id, and
+    every trigram of the vocabulary to the ids of the tokens containing it,
+    which finds the tokens a partial query term is part of. Every note keeps
+    the ids of its tokens in order, and the separators between them that are
+    no single space, so any substring search is answered without reading a
+    file. A note that is removed or indexed again leaves its id behind,
+    which searches skip until enough of them piled up to rebuild the
+    postings.
+
+    >>> index = VaultIndex("test-vault")
+    >>> index.build()
+    >>> sorted(entry.name for entry in index.entries())
+    ['Hallo', 'Test', 'Test', 'Test2']
+    >>> index.vault_name
+    'test-vault'
+    >>> index.load_content()
+    >>> sorted(entry.name for entry in index.search_content("test"))
+    ['Test', 'Test']
+    >>> [entry.name for entry in index.search_content("say hal")]
+    ['Hallo']
+    >>> [entry.name for entry in index.search_content("ust wa")]
+    ['Hallo']
+    >>> index.search_content("tests")
+    []
+    >>> [entry.name for entry in index.search_content("another test")]
+    ['Test']
+    >>> index.search_content("another  test"), index.search_content("test another")
+    ([], [])
+    >>> [entry.name for entry in index.search_content(" a test")]
+    ['Test']
+    >>> sorted(entry.name for entry in index.search_content(" "))
+    ['Hallo', 'Test', 'Test']
+    >>> [entry.name for entry in index.match_terms(["just", "want"])]
+    ['Hallo']
+    >>> matches = index.search_content("test")
+    >>> scores = {entry.path: score for entry, score in zip(matches, index.bm25_scores("test", matches))}
+    >>> scores["test-vault/subdir/Test.md"] > scores["test-vault/Test.md"] > 0
+    True
+    """
+
+    def __init__(self, vault_path: str) -> None:
+        self.vault_path = vault_path
+        self.vault_name = os.path.basename(vault_path)
+        # Excluded files of the vault, reloaded whenever the vault is listed
+        self.exclusions = ExclusionRules.load(vault_path)
+        self._notes: Dict[str, NoteEntry] = {}
+        self._clear_content()
+        # lowercased note name -> paths of the notes linking to it
+        self._backlinks: Dict[str, Set[str]] = {}
+        self._lock = threading.RLock()
+        self.ready = False
+        self.content_enabled = False
+        self.content_ready = False
+        # Increased on every change, lets callers tell if cached data is outdated
+        self.generation = 0
+        self.saved_generation = -1
+
+    def _clear_content(self) -> None:
+        # token id -> token, and back
+        self._vocabulary: List[str] = []
+        self._token_ids: Dict[str, int] = {}
+        # token id -> (note id, occurrences) pairs, ascending by note id
+        self._postings: List[array] = []
+        # separator id -> separator, and back
+        self._separators: List[str] = []
+        self._separator_ids: Dict[str, int] = {}
+        # separator id -> ids of the notes containing it
+        self._separator_notes: List[array] = []
+        # trigram -> ids of the tokens containing it, ascending
+        self._token_trigrams: Dict[str, array] = {}
+        # note id -> entry, None once the note was removed or indexed again
+        self._by_id: List[Optional[NoteEntry]] = []
+        self._dead_ids = 0
+        # Number of notes with indexed content and their summed lengths, for BM25
+        self._content_count = 0
+        self._total_length = 0
+
+    def _list_notes(self) -> List[NoteRecord]:
+        self.exclusions = ExclusionRules.load(self.vault_path)
+        logger.info(f"Listing notes of {self.vault_path}")
+        return list(walk_vault(self.vault_path, self.exclusions))
+
+    def build(self) -> None:
+        """Lists the vault once and replaces the current entries."""
+        notes = {record.path: NoteEntry.from_record(record) for record in self._list_notes()}
+        with self._lock:
+            self._notes = notes
+            self._clear_content()
+            self._backlinks = {}
+            self.ready = True
+            self.content_ready = False
+            self.generation += 1
+        logger.info(f"Indexed {len(notes)} notes in {self.vault_path}")
+
+    def load_content(self) -> None:
+        """Reads and tokenizes every note once. Later changes are applied by the watcher."""
+        self.content_enabled = True
+        for entry in self.entries():
+            if entry.doc_id is None:
+                self._index_content(entry.path)
+        self.content_ready = True
+        logger.info(f"Indexed content of {len(self)} notes in {self.vault_path}")
+
+    def get_state(self) -> dict:
+        """
+        Returns what is needed to restore the index without reading the vault
+        again: the stamp, frontmatter, tokens, separators and links of every
+        note and the postings of every token. Everything derived from them is
+        rebuilt by set_state.
+        Only copying happens under the lock, the caller pickles the state.
+        """
+        with self._lock:
+            notes = [
+                (
+                    entry.path,
+                    entry.mtime_ns,
+                    entry.size,
+                    entry.aliases,
+                    entry.tags,
+                    entry.doc_id,
+                    entry.length,
+                    entry.tokens,
+                    entry.separators,
+                    entry.outline,
+                    tuple(entry.headings),
+                    tuple(entry.links),
+                )
+                for entry in self._notes.values()
+            ]
+            # The postings of all tokens, one after the other
+            postings, ends = array("I"), array("Q")
+            for posting in self._postings:
+                postings.extend(posting)
+                ends.append(len(postings))
+            return {
+                "notes": notes,
+                "vocabulary": list(self._vocabulary),
+                "postings": postings,
+                "ends": ends,
+                "separators": list(self._separators),
+                "note_ids": len(self._by_id),
+                "content_ready": self.content_ready,
+            }
+
+    def set_state(self, state: dict) -> None:
+        """
+        Restores a state from get_state(). The notes may have changed on disk
+        since, so refresh() should follow to re-stamp them.
+
+        >>> index = VaultIndex("test-vault")
+        >>> index.build()
+        >>> index.load_content()
+        >>> restored = VaultIndex("test-vault")
+        >>> restored.set_state(index.get_state())
+        >>> [entry.name for entry in restored.search_content("say hal")]
+        ['Hallo']
+        """
+        notes = {}
+        for (
+            path, mtime_ns, size, aliases, tags, doc_id, length, tokens, separators, note_outline, headings, links
+        ) in state["notes"]:
+            entry = notes[path] = NoteEntry(path, mtime_ns, size)
+            entry.aliases, entry.tags = aliases, tags
+            entry.doc_id, entry.length, entry.tokens, entry.separators = doc_id, length, tokens, separators
+            entry.outline, entry.headings, entry.links = note_outline, frozenset(headings), frozenset(links)
+        postings = split_array(state["postings"], state["ends"])
+
+        with self._lock:
+            self._notes = notes
+            self._clear_content()
+            self._vocabulary = state["vocabulary"]
+            self._postings = postings
+            self._token_ids = {token: token_id for token_id, token in enumerate(self._vocabulary)}
+            for token_id, token in enumerate(self._vocabulary):
+                self._add_token_trigrams(token, token_id)
+            self._separators = state["separators"]
+            self._separator_ids = {separator: separator_id for separator_id, separator in enumerate(self._separators)}
+            self._separator_notes = [array("I") for _ in self._separators]
+            self._by_id = [None] * state["note_ids"]
+            self._backlinks = {}
+            for entry in notes.values():
+                if entry.doc_id is None:
+                    continue
+                self._by_id[entry.doc_id] = entry
+                for separator_id in set(entry.separators[1::2]):
+                    self._separator_notes[separator_id].append(entry.doc_id)
+                self._content_count += 1
+                self._total_length += entry.length
+                for name in entry.links:
+                    self._backlinks.setdefault(name, set()).add(entry.path)
+            self._dead_ids = len(self._by_id) - self._content_count
+            self.content_enabled = self.content_ready = state["content_ready"]
+            self.ready = True
+            self.generation += 1
+
+    def refresh(self) -> None:
+        """
+        Lists the vault again and applies only the differences, used when
+        file events were lost. Notes excluded meanwhile are dropped.
+        """
+        records = {record.path: record for record in self._list_notes()}
+        with self._lock:
+            known = set(self._notes)
+        for path in known - records.keys():
+            self.remove_note(path)
+        for record in records.values():
+            self.update_note(record.path, record)
+
+    def add_note(self, path: str, record: Optional[NoteRecord] = None) -> None:
+        if not is_note_path(self.vault_path, path, self.exclusions):
+            return
+        entry = NoteEntry.from_disk(path) if record is None else NoteEntry.from_record(record)
+        with self._lock:
+            self._remove_postings(self._notes.get(path))
+            self._notes[path] = entry
+            self.generation += 1
+        if self.content_enabled:
+            self._index_content(path)
+
+    def update_note(self, path: str, record: Optional[NoteRecord] = None) -> None:
+        """
+        Re-stamps a note that changed on disk, adding it if it is unknown.
+        A record from a vault walk saves stat-ing the note again.
+        """
+        if not is_note_path(self.vault_path, path, self.exclusions):
+            return
+        with self._lock:
+            entry = self._notes.get(path)
+        if entry is None:
+            self.add_note(path, record)
+            return
+        if record is None:
+            try:
+                stat = os.stat(path)
+            except OSError:
+                self.remove_note(path)
+                return
+            record = NoteRecord(path, stat.st_size, stat.st_mtime_ns)
+        if (record.mtime_ns, record.size) != (entry.mtime_ns, entry.size):
+            self.add_note(path, record)
+
+    def remove_note(self, path: str) -> None:
+        with self._lock:
+            entry = self._notes.pop(path, None)
+            if entry is not None:
+                self._remove_postings(entry)
+                self.generation += 1
+
+    def remove_tree(self, directory: str) -> None:
+        """Drops every note below a folder that was deleted or moved away."""
+        prefix = os.path.join(directory, "")
+        with self._lock:
+            for path in [path for path in self._notes if path.startswith(prefix)]:
+                self.remove_note(path)
+
+    def notes_in_directory(self, directory: str) -> List[str]:
+        with self._lock:
+            return [path for path in self._notes if os.path.dirname(path) == directory]
+
+    def get(self, path: str) -> Optional[NoteEntry]:
+        with self._lock:
+            return self._notes.get(path)
+
+    def entries(self) -> List[NoteEntry]:
+        """Returns a snapshot of all entries, safe to iterate while the index changes."""
+        with self._lock:
+            return list(self._notes.values())
+
+    def __len__(self):
+        return len(self._notes)
+
+    def _index_content(self, path: str) -> None:
+        # The file is read outside the lock so searches are not blocked by disk I/O
+        text = read_note(path)
+        if text is None:
+            return
+        pieces = TOKEN_SPLIT_PATTERN.split(text.lower())
+        tokens = pieces[1::2]
+        term_counts = Counter(tokens)
+        # The separator before the first token and the one after the last are
+        # usually no single space, but they may be empty
+        separators = [(position, separator) for position, separator in enumerate(pieces[0::2]) if separator != " "]
+        note_outline = outline(text)
+        note_headings = heading_terms(note_outline)
+        note_links = wikilinks(text)
+        with self._lock:
+            entry = self._notes.get(path)
+            if entry is None:
+                return
+            self._remove_postings(entry)
+            entry.doc_id = len(self._by_id)
+            self._by_id.append(entry)
+            entry.length = len(tokens)
+            entry.outline = note_outline
+            entry.headings = note_headings
+            entry.links = note_links
+            for name in note_links:
+                self._backlinks.setdefault(name, set()).add(path)
+            self._content_count += 1
+            self._total_length += entry.length
+            for token, count in term_counts.items():
+                token_id = self._token_ids.get(token)
+                if token_id is None:
+                    token_id = self._add_token(token)
+                posting = self._postings[token_id]
+                posting.append(entry.doc_id)
+                posting.append(count)
+            entry.tokens = array(TOKEN_TYPECODE, map(self._token_ids.__getitem__, tokens))
+            entry.separators = array("I")
+            for position, separator in separators:
+                separator_id = self._separator_ids.get(separator)
+                if separator_id is None:
+                    separator_id = self._add_separator(separator)
+                entry.separators.append(position)
+                entry.separators.append(separator_id)
+            for separator_id in set(entry.separators[1::2]):
+                self._separator_notes[separator_id].append(entry.doc_id)
+            self.generation += 1
+
+    def _add_token(self, token: str) -> int:
+        token_id = len(self._vocabulary)
+        self._vocabulary.append(token)
+        self._token_ids[token] = token_id
+        self._postings.append(array("I"))
+        self._add_token_trigrams(token, token_id)
+        return token_id
+
+    def _add_separator(self, separator: str) -> int:
+        separator_id = len(self._separators)
+        self._separators.append(separator)
+        self._separator_ids[separator] = separator_id
+        self._separator_notes.append(array("I"))
+        return separator_id
+
+    def _add_token_trigrams(self, token: str, token_id: int) -> None:
+        for trigram in trigrams(token):
+            token_ids = self._token_trigrams.get(trigram)
+            if token_ids is None:
+                token_ids = self._token_trigrams[trigram] = array("I")
+            token_ids.append(token_id)
+
+    def _remove_postings(self, entry: Optional[NoteEntry]) -> None:
+        if entry is None or entry.doc_id is None:
+            return
+        # The pairs of the note stay in the postings until they are compacted
+        self._by_id[entry.doc_id] = None
+        entry.doc_id = None
+        self._dead_ids += 1
+        self._content_count -= 1
+        self._total_length -= entry.length
+        for name in entry.links:
+            sources = self._backlinks.get(name)
+            if sources is None:
+                continue
+            sources.discard(entry.path)
+            if not sources:
+                del self._backlinks[name]
+        if self._dead_ids > max(self._content_count * COMPACT_RATIO, 1000):
+            self._compact()
+
+    def _compact(self) -> None:
+        """Renumbers the notes, dropping the ids and tokens no indexed note uses anymore."""
+        new_ids: Dict[int, int] = {}
+        by_id: List[Optional[NoteEntry]] = []
+        for doc_id, entry in enumerate(self._by_id):
+            if entry is not None:
+                new_ids[doc_id] = entry.doc_id = len(by_id)
+                by_id.append(entry)
+
+        vocabulary, postings = [], []
+        # old token id -> new token id
+        token_ids: Dict[int, int] = {}
+        for token_id, (token, posting) in enumerate(zip(self._vocabulary, self._postings)):
+            compacted = array("I")
+            for doc_id, count in zip(posting[0::2], posting[1::2]):
+                new_id = new_ids.get(doc_id)
+                if new_id is not None:
+                    compacted.append(new_id)
+                    compacted.append(count)
+            if compacted:
+                token_ids[token_id] = len(vocabulary)
+                vocabulary.append(token)
+                postings.append(compacted)
+        for entry in by_id:
+            entry.tokens = array(TOKEN_TYPECODE, map(token_ids.__getitem__, entry.tokens))
+        # Separators are few, they are all kept
+        self._separator_notes = [
+            array("I", (new_ids[doc_id] for doc_id in doc_ids if doc_id in new_ids))
+            for doc_ids in self._separator_notes
+        ]
+
+        logger.info(
+            f"Compacted the content index of {self.vault_path}: "
+            f"{len(self._by_id) - len(by_id)} note ids and {len(self._vocabulary) - len(vocabulary)} tokens dropped"
+        )
+        self._by_id = by_id
+        self._dead_ids = 0
+        self._vocabulary = vocabulary
+        self._postings = postings
+        self._token_ids = {token: token_id for token_id, token in enumerate(vocabulary)}
+        self._token_trigrams = {}
+        for token_id, token in enumerate(vocabulary):
+            self._add_token_trigrams(token, token_id)
+
+    def backlink_count(self, entry: NoteEntry) -> int:
+        """The number of notes linking to a note, 0 until the content is indexed."""
+        return len(self._backlinks.get(entry.name_lower, ()))
+
+    def backlinks(self, entry: NoteEntry) -> List[NoteEntry]:
+        """Returns the notes linking to or embedding a note."""
+        with self._lock:
+            paths = self._backlinks.get(entry.name_lower, ())
+            return [self._notes[path] for path in paths if path in self._notes and path != entry.path]
+
+    def _note_ids(self, token_ids: Iterable[int]) -> Set[int]:
+        """The ids of the indexed notes containing any of the given tokens."""
+        postings = self._postings
+        doc_ids = set().union(*(postings[token_id][0::2] for token_id in token_ids))
+        if self._dead_ids:
+            by_id = self._by_id
+            doc_ids = {doc_id for doc_id in doc_ids if by_id[doc_id] is not None}
+        return doc_ids
+
+    def _frequencies(self, token_ids: Iterable[int]) -> Dict[int, int]:
+        """Sums the occurrences of the given tokens per indexed note id."""
+        frequencies: Dict[int, int] = {}
+        get = frequencies.get
+        for token_id in token_ids:
+            posting = self._postings[token_id]
+            for doc_id, count in zip(posting[0::2], posting[1::2]):
+                frequencies[doc_id] = get(doc_id, 0) + count
+        if self._dead_ids:
+            by_id = self._by_id
+            frequencies = {doc_id: count for doc_id, count in frequencies.items() if by_id[doc_id] is not None}
+        return frequencies
+
+    def match_terms(self, terms: List[str]) -> List[NoteEntry]:
+        """Returns the notes containing every one of the given (whole) terms."""
+        with self._lock:
+            doc_ids: Optional[Set[int]] = None
+            for term in terms:
+                token_id = self._token_ids.get(term.lower())
+                found = self._note_ids([token_id]) if token_id is not None else set()
+                doc_ids = found if doc_ids is None else doc_ids & found
+                if not doc_ids:
+                    return []
+            return [self._by_id[doc_id] for doc_id in sorted(doc_ids or ())]
+
+    def _fixed_separators(self, search_separators: List[str]) -> List[Tuple[int, Set[int]]]:
+        """
+        Returns the (index, separator ids) of the separators of a search that
+        cannot be a single space, with the ids of the separators of the notes
+        they can be.
+        """
+        fixed = []
+        last = len(search_separators) - 1
+        for i, search_separator in enumerate(search_separators):
+            if i == 0:
+                if " ".endswith(search_separator):
+                    continue
+                separator_ids = {j for j, separator in enumerate(self._separators) if separator.endswith(search_separator)}
+            elif i == last:
+                if " ".startswith(search_separator):
+                    continue
+                separator_ids = {j for j, separator in enumerate(self._separators) if separator.startswith(search_separator)}
+            else:
+                if search_separator == " ":
+                    continue
+                separator_id = self._separator_ids.get(search_separator)
+                separator_ids = set() if separator_id is None else {separator_id}
+            fixed.append((i, separator_ids))
+        return fixed
+
+    def _phrase_matches(self, entry: NoteEntry, phrase: Phrase) -> bool:
+        """
+        Tells if a note holds a token of every expansion of a phrase right after
+        one of the previous expansion, separated like the tokens of the search.
+        The first and the last separator of the search only have to be the end
+        and the start of the separator in the note.
+        """
+        tokens = entry.tokens
+        expansions, separators = phrase.expansions, phrase.separators
+        last = len(expansions)
+        # The phrase can start at most this far into the note
+        end = len(tokens) - last
+        if phrase.fixed:
+            anchor, separator_ids = phrase.fixed[0]
+            starts = [
+                position - anchor
+                for position, separator_id in zip(entry.separators[0::2], entry.separators[1::2])
+                if separator_id in separator_ids and anchor <= position <= end + anchor
+            ]
+        else:
+            anchor = phrase.anchor
+            anchor_ids = expansions[anchor]
+            if len(anchor_ids) > 1:
+                anchor_ids = anchor_ids.intersection(tokens)
+            data = tokens.tobytes()
+            starts = [
+                position - anchor
+                for token_id in anchor_ids
+                for position in token_positions(data, token_id)
+                if anchor <= position <= end + anchor
+            ]
+        for i, token_ids in enumerate(expansions):
+            if not starts:
+                return False
+            if phrase.fixed or i != anchor:
+                following = map(tokens.__getitem__, map(i.__add__, starts))
+                starts = list(compress(starts, map(token_ids.__contains__, following)))
+        if not starts:
+            return False
+
+        stored = dict(zip(entry.separators[0::2], entry.separators[1::2]))
+
+        def separator(position: int) -> str:
+            separator_id = stored.get(position)
+            return " " if separator_id is None else self._separators[separator_id]
+
+        first = separators[0]
+        for start in starts:
+            if first and not separator(start).endswith(first):
+                continue
+            if separators[last] and not separator(start + last).startswith(separators[last]):
+                continue
+            if all(separator(start + i) == separators[i] for i in range(1, last)):
+                return True
+        return False
+
+    def _prepare_phrase(self, search_lower: str) -> Tuple[Optional[Set[int]], Optional[Phrase]]:
+        """
+        Returns the ids of the indexed notes holding every token and separator
+        of a substring search that cannot be a single space, and the phrase
+        they still have to be checked for, None if they all contain the search.
+        Returns None as the ids if the search has no token and nothing can be
+        ruled out.
+        """
+        pieces = TOKEN_SPLIT_PATTERN.split(search_lower)
+        separators = pieces[0::2]
+        if len(pieces) == 1:
+            if not search_lower:
+                return None, None
+            # Without a token, the search has to be part of a single separator
+            doc_ids = set().union(
+                *(
+                    self._separator_notes[separator_id]
+                    for separator_id, separator in enumerate(self._separators)
+                    if search_lower in separator
+                )
+            )
+            if search_lower == " ":
+                # A note has length + 1 separators, those not stored are a single space
+                doc_ids.update(
+                    doc_id
+                    for doc_id, entry in enumerate(self._by_id)
+                    if entry is not None and len(entry.separators) // 2 <= entry.length
+                )
+            return {doc_id for doc_id in doc_ids if self._by_id[doc_id] is not None}, None
+
+        expansions = []
+        fixed = self._fixed_separators(separators)
+        doc_ids: Optional[Set[int]] = None
+        for _, separator_ids in fixed:
+            found = set().union(*(self._separator_notes[separator_id] for separator_id in separator_ids))
+            doc_ids = found if doc_ids is None else doc_ids & found
+        for match in TOKEN_PATTERN.finditer(search_lower):
+            token_ids = self._expand_token(search_lower, match)
+            found = self._note_ids(token_ids)
+            doc_ids = found if doc_ids is None else doc_ids & found
+            if not doc_ids:
+                return doc_ids, None
+            expansions.append(set(token_ids))
+        if len(expansions) == 1 and not separators[0] and not separators[1]:
+            # A single token is found by the postings alone
+            return doc_ids, None
+        postings = self._postings
+        anchor = min(range(len(expansions)), key=lambda i: sum(len(postings[token_id]) for token_id in expansions[i]))
+        return doc_ids, Phrase(search_lower, self._vocabulary, expansions, anchor, separators, fixed)
+
+    def _contains(self, phrase: Phrase, entry: NoteEntry) -> bool:
+        with self._lock:
+            if entry.doc_id is None:
+                return False
+            if phrase.vocabulary is not self._vocabulary:
+                # The token ids changed since the phrase was prepared
+                _, prepared = self._prepare_phrase(phrase.search_lower)
+                if prepared is None:
+                    # No indexed note holds all its tokens anymore
+                    return False
+                phrase.vocabulary, phrase.expansions, phrase.anchor = (
+                    prepared.vocabulary,
+                    prepared.expansions,
+                    prepared.anchor,
+                )
+            return self._phrase_matches(entry, phrase)
+
+    def _expand_token(self, search_lower: str, match: "re.Match") -> List[int]:
+        """
+        Returns the ids of the indexed tokens a token of a substring search can
+        be part of. A token inside the query must appear as a whole, while the
+        first and last token may only be the end or start of a longer one.
+        """
+        token = match.group()
+        open_start = match.start() == 0
+        open_end = match.end() == len(search_lower)
+        if not open_start and not open_end:
+            token_id = self._token_ids.get(token)
+            return [] if token_id is None else [token_id]
+
+        if len(token) >= 3:
+            # Only tokens holding every trigram of the query token can contain it
+            postings = sorted((self._token_trigrams.get(trigram, ()) for trigram in trigrams(token)), key=len)
+            candidates: Iterable[int] = set(postings[0])
+            for token_ids in postings[1:]:
+                if not candidates:
+                    break
+                candidates.intersection_update(token_ids)
+        else:
+            candidates = range(len(self._vocabulary))
+
+        vocabulary = self._vocabulary
+        if open_start and open_end:
+            return [token_id for token_id in candidates if token in vocabulary[token_id]]
+        if open_start:
+            return [token_id for token_id in candidates if vocabulary[token_id].endswith(token)]
+        return [token_id for token_id in candidates if vocabulary[token_id].startswith(token)]
+
+    def bm25_scores(self, search: str, entries: List[NoteEntry]) -> List[float]:
+        """
+        Scores notes matching a content search with BM25: terms count more the
+        more often they occur in a note and the rarer they are in the vault,
+        while long notes are penalized. Terms found in the note name or in a
+        heading get an extra boost. Partial terms at either end of the query
+        count every indexed token they are part of.
+        Returns the scores in the order of entries.
+        """
+        search_lower = search.lower()
+        scores = [0.0] * len(entries)
+        if not entries:
+            return scores
+
+        with self._lock:
+            document_count = max(self._content_count, 1)
+            average_length = self._total_length / document_count or 1.0
+            for match in TOKEN_PATTERN.finditer(search_lower):
+                token_ids = self._expand_token(search_lower, match)
+                if not token_ids:
+                    continue
+                frequencies = self._frequencies(token_ids)
+                document_frequency = min(len(frequencies), document_count)
+                idf = math.log(1 + (document_count - document_frequency + 0.5) / (document_frequency + 0.5))
+                token_set = {self._vocabulary[token_id] for token_id in token_ids}
+
+                for i, entry in enumerate(entries):
+                    frequency = frequencies.get(entry.doc_id, 0)
+                    if frequency:
+                        norm = BM25_K1 * (1 - BM25_B + BM25_B * entry.length / average_length)
+                        scores[i] += idf * frequency * (BM25_K1 + 1) / (frequency + norm)
+                    if any(token in token_set for token in tokenize(entry.name_lower)):
+                        scores[i] += idf * TITLE_BOOST
+                    if any(token in token_set for token in entry.headings):
+                        scores[i] += idf * HEADING_BOOST
+        return scores
+
+    def content_candidates(
+        self, search: str, candidates: Optional[List[NoteEntry]] = None
+    ) -> Tuple[List[NoteEntry], Optional[Callable[[NoteEntry], bool]]]:
+        """
+        Narrows a content search down to the notes holding every token of the
+        search. Returns the notes and a function telling which of them contain
+        the search, None if they all do, e.g. for a single token. Neither reads
+        any file: the tokens and separators of every note are in the index.
+        Callers that already know a superset of the matches can pass it as
+        candidates.
+        """
+        search_lower = search.lower()
+        with self._lock:
+            doc_ids, phrase = self._prepare_phrase(search_lower)
+            if candidates is not None:
+                entries = [
+                    entry
+                    for entry in candidates
+                    if entry.doc_id is not None and (doc_ids is None or entry.doc_id in doc_ids)
+                ]
+            elif doc_ids is None:
+                entries = [entry for entry in self._by_id if entry is not None]
+            else:
+                entries = [self._by_id[doc_id] for doc_id in sorted(doc_ids)]
+        return entries, None if phrase is None else functools.partial(self._contains, phrase)
+
+    def search_content(
+        self,
+        search: str,
+        cancelled: Optional[Callable[[], bool]] = None,
+        candidates: Optional[List[NoteEntry]] = None,
+    ) -> List[NoteEntry]:
+        """
+        Returns the notes whose content contains the search string, ignoring
+        case. Any substring matches just like a plain scan would.
+        """
+        entries, contains = self.content_candidates(search, candidates)
+        if contains is None:
+            return entries
+        return [entry for entry in check_cancelled(entries, cancelled) if contains(entry)]
+
+
+if __name__ == "__main__":
+    import doctest
+
+    doctest.testmod()
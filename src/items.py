@@ -1,7 +1,6 @@
 import os
 from typing import List
 from ulauncher.api.shared.item.ExtensionResultItem import ExtensionResultItem
-from ulauncher.api.shared.action.OpenAction import OpenAction
 from ulauncher.api.shared.action.ExtensionCustomAction import ExtensionCustomAction
 
 from .functions import generate_url, Note
@@ -111,14 +110,19 @@ def show_notes(notes: List[Note], limit = 10) -> list: # Removed 'vault' paramet
 
         # Use the generate_url function from src.functions, passing all required arguments
         # note.path is the full_file_path from find_note_in_vault or find_string_in_vault
-        url = generate_url(note.vault_name, note.path, note.full_vault_path, mode="open")
+        # Content matches open at the heading they were found under
+        url = generate_url(note.vault_name, note.path, note.full_vault_path, mode="open", heading=note.heading)
 
         items.append(
             ExtensionResultItem(
                 icon=ICON_FILE,
                 name=note.name,
                 description=description_text,
-                on_enter=OpenAction(url),
+                # Opened through the extension, so the open is recorded for frecency
+                on_enter=ExtensionCustomAction(
+                    {"type": "open-note", "url": url, "path": note.path},
+                    keep_app_open=False,
+                ),
             )
         )
     return items
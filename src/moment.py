@@ -1,16 +1,54 @@
-# the order is important
+import re
+import datetime
+import functools
+from typing import Callable, Tuple, Union
+
+
+def locale_week(date: datetime.date) -> Tuple[int, int]:
+    """
+    The (week year, week) of a date in moment's default locale: weeks start
+    on Sunday and week 1 is the week containing January 1. A week belongs
+    to the year its Saturday is in.
+
+    >>> locale_week(datetime.date(2021, 7, 16)), locale_week(datetime.date(2022, 1, 1))
+    ((2021, 29), (2022, 1))
+    >>> locale_week(datetime.date(2021, 12, 26)), locale_week(datetime.date(2021, 12, 25))
+    ((2022, 1), (2021, 52))
+    """
+    saturday = date + datetime.timedelta(days=6 - (date.weekday() + 1) % 7)
+    return saturday.year, (saturday.timetuple().tm_yday - 1) // 7 + 1
+
+
+def ordinal(number: int) -> str:
+    """
+    >>> [ordinal(n) for n in (1, 2, 3, 4, 11, 12, 13, 21, 22, 23)]
+    ['1st', '2nd', '3rd', '4th', '11th', '12th', '13th', '21st', '22nd', '23rd']
+    """
+    if number % 100 in (11, 12, 13):
+        return f"{number}th"
+    return f"{number}{({1: 'st', 2: 'nd', 3: 'rd'}).get(number % 10, 'th')}"
+
+
+# Moment tokens and their strftime directive, or a function for the tokens
+# strftime has no directive for. Tokens are matched longest first.
 token_map = {
-    "%": "%%",
     "A": "%p",
-    "ww": "%W",
+    "ww": lambda date: f"{locale_week(date)[1]:02d}",
+    "WW": "%V",
+    "W": lambda date: str(date.isocalendar()[1]),
     "dddd": "%A",
     "ddd": "%a",
+    "dd": lambda date: date.strftime("%a")[:2],
     "d": "%w",
     "MMMM": "%B",
     "MMM": "%b",
     "MM": "%m",
+    "M": lambda date: str(date.month),
+    "Q": lambda date: str((date.month - 1) // 3 + 1),
     "YYYY": "%Y",
     "YY": "%y",
+    "gggg": lambda date: str(locale_week(date)[0]),
+    "GGGG": "%G",
     "HH": "%H",
     "hh": "%I",
     "mm": "%M",
@@ -20,17 +58,84 @@ token_map = {
     "z": "%Z",
     "DDDD": "%j",
     "DD": "%d",
+    "Do": lambda date: ordinal(date.day),
+    "D": lambda date: str(date.day),
 }
 
-def convert_moment_to_strptime_format(moment_date: str):
+# [escaped] literals, then the tokens longest first, then any other character
+TOKEN_PATTERN = re.compile(
+    r"\[([^\]]*)\]|("
+    + "|".join(re.escape(token) for token in sorted(token_map, key=len, reverse=True))
+    + r")|(.)",
+    re.DOTALL,
+)
+
+Part = Union[str, Callable[[datetime.date], str]]
+
+
+@functools.lru_cache(maxsize=256)
+def compile_moment_format(moment_date: str) -> Tuple[Part, ...]:
+    """
+    Splits a moment format into strftime fragments and functions in a single
+    pass. Literal text is escaped for strftime, neighbouring fragments are merged.
+
+    >>> compile_moment_format("YYYY-[W]WW")
+    ('%Y-W%V',)
+    >>> len(compile_moment_format("YYYY-[Q]Q"))
+    2
+    """
+    parts = []
+    for match in TOKEN_PATTERN.finditer(moment_date):
+        literal, token, other = match.groups()
+        if token is not None:
+            part = token_map[token]
+        else:
+            part = (literal if literal is not None else other).replace("%", "%%")
+        if isinstance(part, str) and parts and isinstance(parts[-1], str):
+            parts[-1] += part
+        else:
+            parts.append(part)
+    return tuple(parts)
+
+
+def convert_moment_to_strptime_format(moment_date: str) -> str:
     """
+    Converts a moment format to strftime. Raises ValueError for formats with
+    tokens strftime has no directive for, use format_moment for those.
+
     >>> convert_moment_to_strptime_format("YYYY-MM-DD")
     '%Y-%m-%d'
+    >>> convert_moment_to_strptime_format("[Week] WW, DDDD")
+    'Week %V, %j'
+    >>> convert_moment_to_strptime_format("YYYY/MM/YYYY-MM-DD 100%")
+    '%Y/%m/%Y-%m-%d 100%%'
+    >>> convert_moment_to_strptime_format("DD-M")
+    Traceback (most recent call last):
+    ...
+    ValueError: strftime cannot express the moment format 'DD-M'
+    """
+    parts = compile_moment_format(moment_date)
+    if not all(isinstance(part, str) for part in parts):
+        raise ValueError(f"strftime cannot express the moment format '{moment_date}'")
+    return "".join(parts)
+
+
+def format_moment(date: datetime.date, moment_date: str) -> str:
+    """
+    Formats a date like moment(date).format(moment_date) would.
+
+    >>> format_moment(datetime.date(2021, 7, 16), "YYYY/MM/YYYY-MM-DD")
+    '2021/07/2021-07-16'
+    >>> format_moment(datetime.date(2021, 7, 16), "YYYY-[Q]Q, [Day] D.M.")
+    '2021-Q3, Day 16.7.'
+    >>> format_moment(datetime.date(2021, 7, 16), "dddd, MMMM Do YYYY"), format_moment(datetime.date(2021, 7, 16), "dd")
+    ('Friday, July 16th 2021', 'Fr')
+    >>> format_moment(datetime.date(2021, 7, 16), "gggg-[W]ww"), format_moment(datetime.date(2022, 1, 1), "gggg-[W]ww")
+    ('2021-W29', '2022-W01')
     """
-    strptime_date = moment_date
-    for [mt, st] in token_map.items():
-        strptime_date = strptime_date.replace(mt, st)
-    return strptime_date
+    return "".join(
+        date.strftime(part) if isinstance(part, str) else part(date) for part in compile_moment_format(moment_date)
+    )
 
 
 if __name__ == "__main__":
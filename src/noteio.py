@@ -0,0 +1,137 @@
+import os
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Attempts of an append before giving up, the delay between them doubles every time
+MAX_ATTEMPTS = 6
+BACKOFF_START = 0.01
+
+
+class NoteBusyError(OSError):
+    """Raised when a note kept changing under an append, e.g. while Obsidian or a sync client rewrote it."""
+
+
+def _stamp(stat: os.stat_result) -> tuple:
+    return (stat.st_dev, stat.st_ino, stat.st_size, stat.st_mtime_ns)
+
+
+def _write_all(fd: int, data: bytes) -> None:
+    view = memoryview(data)
+    while view:
+        view = view[os.write(fd, view) :]
+
+
+def _create(path: str, data: bytes, fsync: bool) -> bool:
+    try:
+        fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o644)
+    except FileExistsError:
+        return False
+    try:
+        _write_all(fd, data)
+        if fsync:
+            os.fsync(fd)
+    finally:
+        os.close(fd)
+    return True
+
+
+def create_note(path: str, content: str, fsync: bool = False) -> bool:
+    """
+    Creates a note holding content. The note is created with O_EXCL, so an
+    existing note, even one created a moment ago by someone else, is never
+    overwritten. Returns False if the note already existed.
+
+    >>> import tempfile
+    >>> path = os.path.join(tempfile.mkdtemp(), "Note.md")
+    >>> create_note(path, "# Note"), create_note(path, "# Other")
+    (True, False)
+    >>> open(path).read()
+    '# Note'
+    """
+    return _create(path, content.encode("utf-8"), fsync)
+
+
+def _ends_with(path: str, data: bytes) -> bool:
+    try:
+        with open(path, "rb") as f:
+            size = f.seek(0, os.SEEK_END)
+            if size < len(data):
+                return False
+            f.seek(size - len(data))
+            return f.read() == data
+    except OSError:
+        return False
+
+
+def _try_append(path: str, data: bytes, fsync: bool) -> bool:
+    """Appends data once, returns False if the note changed under the attempt and it needs another one."""
+    try:
+        before = os.stat(path)
+    except FileNotFoundError:
+        # Someone else creating the note meanwhile makes the next attempt append to it
+        return _create(path, data, fsync)
+
+    fd = os.open(path, os.O_WRONLY | os.O_APPEND)
+    try:
+        # The file opened must be the one stat saw, unchanged. Obsidian and sync
+        # clients often save by renaming a new file over the note, or may be in
+        # the middle of writing it.
+        if _stamp(os.fstat(fd)) != _stamp(before):
+            logger.debug(f"{path} changed while it was opened")
+            return False
+        # A single write with O_APPEND lands at the end even if someone appended
+        # meanwhile, so no lock is needed
+        _write_all(fd, data)
+        if fsync:
+            os.fsync(fd)
+        after = os.fstat(fd)
+    finally:
+        os.close(fd)
+
+    if after.st_size != before.st_size + len(data):
+        logger.warning(f"{path} was written by someone else while appending to it")
+    try:
+        current = os.stat(path)
+    except FileNotFoundError:
+        logger.debug(f"{path} was removed right after appending to it")
+        return False
+    if (current.st_dev, current.st_ino) == (after.st_dev, after.st_ino):
+        return True
+    # The note was replaced right after the write. The new file holds the text
+    # if it was read after the write, otherwise the text has to be appended again.
+    logger.debug(f"{path} was replaced right after appending to it")
+    return _ends_with(path, data)
+
+
+def append_text(path: str, text: str, fsync: bool = False) -> None:
+    """
+    Appends text to a note, creating the note if it does not exist. Nothing
+    is written while the note is being replaced or rewritten; the append
+    is retried with a growing delay instead, and NoteBusyError is raised
+    if the note never settled. Text written to a note that was replaced
+    right after is written again, unless the new note already ends with it.
+
+    >>> import tempfile
+    >>> path = os.path.join(tempfile.mkdtemp(), "Note.md")
+    >>> append_text(path, "# Note")
+    >>> append_text(path, "\\nfirst")
+    >>> open(path).read()
+    '# Note\\nfirst'
+    """
+    data = text.encode("utf-8")
+    delay = BACKOFF_START
+    for attempt in range(MAX_ATTEMPTS):
+        if _try_append(path, data, fsync):
+            return
+        if attempt < MAX_ATTEMPTS - 1:
+            time.sleep(delay)
+            delay *= 2
+    raise NoteBusyError(f"{path} kept changing, gave up appending after {MAX_ATTEMPTS} attempts")
+
+
+if __name__ == "__main__":
+    import doctest
+
+    doctest.testmod()
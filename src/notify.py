@@ -0,0 +1,32 @@
+import threading
+import logging
+
+logger = logging.getLogger(__name__)
+
+APP_NAME = "Ulauncher Obsidian"
+
+_notify = None
+_lock = threading.Lock()
+
+
+def _get_notify():
+    """Imports libnotify through gi and initializes it, once and only when the first notification is shown."""
+    global _notify
+    with _lock:
+        if _notify is None:
+            import gi
+
+            gi.require_version("Notify", "0.7")
+            from gi.repository import Notify
+
+            Notify.init(APP_NAME)
+            _notify = Notify
+        return _notify
+
+
+def notify(summary: str, body: str) -> None:
+    """Shows a desktop notification, failing to do so is only logged."""
+    try:
+        _get_notify().Notification.new(summary, body, None).show()
+    except Exception as e:
+        logger.warning(f"Could not show notification '{summary}: {body}': {e}")
@@ -0,0 +1,83 @@
+import sys
+import threading
+from collections import OrderedDict
+from typing import Hashable, List, Optional, Tuple
+
+# Rough cost of one cached entry besides its candidates
+ENTRY_OVERHEAD = 200
+
+
+class QueryCache:
+    """
+    LRU cache of the candidates a query matched, keyed by (vault, mode, query).
+
+    Every mode cached here must be monotonic: whatever a query matches, the
+    query extended by more characters can only match a subset of it. A new
+    query is then only checked against the candidates of its longest cached
+    prefix. Entries remember the generation of the vault index they were
+    computed from and are ignored once the vault changed.
+
+    >>> cache = QueryCache(max_bytes=10_000)
+    >>> cache.put("vault", "content", "proj", 1, ["a.md", "b.md"])
+    >>> cache.find_prefix("vault", "content", "projec", 1)
+    ['a.md', 'b.md']
+    >>> cache.find_prefix("vault", "content", "projec", 2) is None
+    True
+    >>> cache.find_prefix("vault", "name", "projec", 1) is None
+    True
+    """
+
+    def __init__(self, max_bytes: int) -> None:
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[Tuple[str, str, str], Tuple[Hashable, List, int]]" = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+
+    def find_prefix(self, vault_path: str, mode: str, query: str, generation: Hashable) -> Optional[List]:
+        """Returns the candidates of the longest cached prefix of query (itself included)."""
+        with self._lock:
+            for length in range(len(query), 0, -1):
+                key = (vault_path, mode, query[:length])
+                cached = self._entries.get(key)
+                if cached is None:
+                    continue
+                cached_generation, candidates, _ = cached
+                if cached_generation != generation:
+                    self._remove(key)
+                    continue
+                self._entries.move_to_end(key)
+                return candidates
+        return None
+
+    def put(self, vault_path: str, mode: str, query: str, generation: Hashable, candidates: List) -> None:
+        if not query:
+            return
+        key = (vault_path, mode, query)
+        size = ENTRY_OVERHEAD + sys.getsizeof(candidates) + len(query)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            self._remove(key)
+            self._entries[key] = (generation, candidates, size)
+            self._size += size
+            while self._size > self.max_bytes:
+                self._remove(next(iter(self._entries)))
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._size = 0
+
+    def _remove(self, key) -> None:
+        cached = self._entries.pop(key, None)
+        if cached is not None:
+            self._size -= cached[2]
+
+    def __len__(self):
+        return len(self._entries)
+
+
+if __name__ == "__main__":
+    import doctest
+
+    doctest.testmod()
@@ -0,0 +1,200 @@
+import os
+import mmap
+import logging
+import contextlib
+import concurrent.futures
+from typing import Callable, List, Optional, Tuple
+
+from .cancellation import SearchCancelled, check_cancelled
+
+logger = logging.getLogger(__name__)
+
+CONTEXT_SIZE = 50 # Increased context size for better preview
+# Vaults with fewer files are scanned in the calling process
+PARALLEL_SCAN_MIN_FILES = 500
+SHARDS_PER_WORKER = 4
+# Bytes lowercased at once when scanning a memory mapped file
+SCAN_CHUNK_SIZE = 256 * 1024
+
+# (path, byte offset of the first match)
+ScanResult = Tuple[str, int]
+
+
+def make_preview(content: str, match_index: int, match_length: int) -> str:
+    """
+    Cuts the text around a match, adding ellipses where content is truncated.
+
+    >>> make_preview("This is a test", 10, 4)
+    'This is a test'
+    >>> preview = make_preview("a" * 100 + "needle", 100, 6)
+    >>> preview.startswith("..."), preview.endswith("needle"), len(preview)
+    (True, True, 59)
+    """
+    start = max(0, match_index - CONTEXT_SIZE)
+    end = min(len(content), match_index + match_length + CONTEXT_SIZE)
+
+    preview_text = content[start:end].strip()
+    if start > 0:
+        preview_text = "..." + preview_text
+    if end < len(content):
+        preview_text += "..."
+    return preview_text
+
+
+def preview_from_bytes(data: bytes, offset: int, length: int) -> str:
+    """
+    Builds the same preview as make_preview, but only decodes the bytes
+    around the match. A UTF-8 character takes at most 4 bytes.
+
+    >>> preview_from_bytes("Grüße aus dem Test".encode("utf-8"), 16, 4)
+    'Grüße aus dem Test'
+    """
+    window = CONTEXT_SIZE * 4
+    before = data[max(0, offset - window):offset].decode("utf-8", "ignore")
+    match = data[offset:offset + length].decode("utf-8", "ignore")
+    after = data[offset + length:offset + length + window].decode("utf-8", "ignore")
+
+    preview_text = (before[-CONTEXT_SIZE:] + match + after[:CONTEXT_SIZE]).strip()
+    if len(before) > CONTEXT_SIZE or offset > window:
+        preview_text = "..." + preview_text
+    if len(after) > CONTEXT_SIZE or offset + length + window < len(data):
+        preview_text += "..."
+    return preview_text
+
+
+def find_ignore_case(data, needle: bytes, start: int = 0) -> int:
+    """
+    Finds an ASCII needle in a bytes-like buffer ignoring ASCII case, which is
+    exactly what a decoded, lowercased search would match: UTF-8 never uses
+    ASCII bytes inside multi-byte characters. Needles without letters are
+    searched in place. Otherwise the buffer is lowercased in chunks of
+    SCAN_CHUNK_SIZE bytes, so large files never get copied as a whole.
+
+    >>> find_ignore_case(b"a NeEdLe", b"needle")
+    2
+    >>> find_ignore_case(b"x" * (SCAN_CHUNK_SIZE - 2) + b"NEEDLE", b"needle") == SCAN_CHUNK_SIZE - 2
+    True
+    >>> find_ignore_case(b"2021-07-16", b"07-1")
+    5
+    """
+    if needle == needle.upper():
+        return data.find(needle, start)
+
+    overlap = len(needle) - 1
+    while start < len(data):
+        chunk = data[start:start + SCAN_CHUNK_SIZE + overlap].lower()
+        found = chunk.find(needle)
+        if found != -1:
+            return start + found
+        start += SCAN_CHUNK_SIZE
+    return -1
+
+
+@contextlib.contextmanager
+def open_buffer(path: str):
+    """
+    Opens a file as a bytes-like buffer. Files of at least SCAN_CHUNK_SIZE
+    bytes are memory mapped instead of read, so they are never copied as a
+    whole. Smaller ones are cheaper to read than to map.
+    """
+    with open(path, "rb") as f:
+        if os.fstat(f.fileno()).st_size < SCAN_CHUNK_SIZE:
+            yield f.read()
+        else:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                yield data
+
+
+def scan_file(path: str, search_lower: str) -> Optional[ScanResult]:
+    """
+    Looks for search_lower in a file, ignoring case. For ASCII searches the
+    raw bytes are matched without decoding or lowercasing the file as a whole.
+    """
+    with open_buffer(path) as data:
+        offset = find_in_buffer(data, search_lower)
+    if offset == -1:
+        return None
+    return path, offset
+
+
+def find_in_buffer(data, search_lower: str, start: int = 0) -> int:
+    """
+    Returns the byte offset of the first match at or after start, or -1.
+
+    >>> data = "über über".encode("utf-8")
+    >>> find_in_buffer(data, "über"), find_in_buffer(data, "über", 1), find_in_buffer(data, "über", 6)
+    (0, 6, 6)
+    """
+    if search_lower.isascii():
+        return find_ignore_case(data, search_lower.encode("ascii"), start)
+
+    # A start inside a UTF-8 character moves on to the next character
+    while start < len(data) and data[start] & 0xC0 == 0x80:
+        start += 1
+    # Unicode fallback: non ASCII letters have case variants made of other bytes
+    content = str(data[start:], "utf-8", "ignore")
+    match_index = content.lower().find(search_lower)
+    if match_index == -1:
+        return -1
+    return start + len(content[:match_index].encode("utf-8"))
+
+
+def scan_files(
+    paths: List[str], search_lower: str, cancelled: Optional[Callable[[], bool]] = None
+) -> List[ScanResult]:
+    """Scans a shard of files. Runs in worker processes, so it must stay importable."""
+    results = []
+    for path in check_cancelled(paths, cancelled):
+        try:
+            result = scan_file(path, search_lower)
+        except Exception as e:
+            logger.warning(f"Could not read file {path} for content search: {e}")
+            continue
+        if result is not None:
+            results.append(result)
+    return results
+
+
+def scan_vault_files(
+    paths: List[str],
+    search: str,
+    executor: Optional[concurrent.futures.ProcessPoolExecutor] = None,
+    cancelled: Optional[Callable[[], bool]] = None,
+) -> List[ScanResult]:
+    """
+    Scans files for a search string. Large file lists are split into shards
+    that are scanned on the given process pool, so a cold search is not
+    limited to the one core the GIL allows. Once cancelled() returns True,
+    shards that did not start yet are dropped and SearchCancelled is raised.
+
+    >>> [path for path, _ in scan_vault_files(["test-vault/Test.md", "test-vault/subdir/Hallo.md"], "TEST")]
+    ['test-vault/Test.md']
+    """
+    search_lower = search.lower()
+    if executor is None or len(paths) < PARALLEL_SCAN_MIN_FILES:
+        return scan_files(paths, search_lower, cancelled)
+
+    shard_count = (os.cpu_count() or 1) * SHARDS_PER_WORKER
+    shard_size = -(-len(paths) // shard_count)
+    futures = [
+        executor.submit(scan_files, paths[start:start + shard_size], search_lower)
+        for start in range(0, len(paths), shard_size)
+    ]
+    results = []
+    for future in futures:
+        while True:
+            try:
+                results.extend(future.result(timeout=0.05))
+                break
+            except concurrent.futures.TimeoutError:
+                if cancelled is not None and cancelled():
+                    for pending in futures:
+                        pending.cancel()
+                    raise SearchCancelled()
+    return results
+
+
+if __name__ == "__main__":
+    import doctest
+
+    doctest.testmod()
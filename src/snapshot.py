@@ -0,0 +1,88 @@
+import os
+import zlib
+import tempfile
+import pickle
+import hashlib
+import logging
+
+from .index import VaultIndex
+
+logger = logging.getLogger(__name__)
+
+# Increase whenever the layout of VaultIndex or NoteEntry changes
+SNAPSHOT_VERSION = 10
+
+
+def get_cache_dir() -> str:
+    """
+    >>> os.environ["XDG_CACHE_HOME"] = "/tmp/cache"
+    >>> get_cache_dir()
+    '/tmp/cache/ulauncher-obsidian'
+    """
+    cache_home = os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache")
+    return os.path.join(cache_home, "ulauncher-obsidian")
+
+
+def get_snapshot_path(vault_path: str) -> str:
+    key = hashlib.sha1(os.path.abspath(vault_path).encode("utf-8")).hexdigest()[:16]
+    return os.path.join(get_cache_dir(), f"index-{key}.pickle.z")
+
+
+def save_snapshot(index: VaultIndex) -> bool:
+    """
+    Writes the index of a vault to the cache directory, including the
+    mtime/size stamp of every note. Returns False if nothing needed saving.
+    Saves of the same vault may run at once, each writes its own temporary
+    file and the last rename wins.
+    """
+    generation = index.generation
+    if index.saved_generation == generation or not index.ready:
+        return False
+
+    snapshot = {"version": SNAPSHOT_VERSION, "vault_path": index.vault_path, "state": index.get_state()}
+    data = zlib.compress(pickle.dumps(snapshot, protocol=pickle.HIGHEST_PROTOCOL), 1)
+
+    path = get_snapshot_path(index.vault_path)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    # Write next to the target and rename, so a crash never leaves half a snapshot
+    fd, temporary_path = tempfile.mkstemp(prefix=os.path.basename(path) + ".", suffix=".tmp", dir=os.path.dirname(path))
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.replace(temporary_path, path)
+    except BaseException:
+        os.unlink(temporary_path)
+        raise
+    index.saved_generation = generation
+    logger.info(f"Saved index snapshot of {index.vault_path} to {path} ({len(data)} bytes)")
+    return True
+
+
+def load_snapshot(index: VaultIndex) -> bool:
+    """
+    Restores the index of a vault from its snapshot. Returns False if there is
+    no usable snapshot, in which case the index has to be built.
+    """
+    path = get_snapshot_path(index.vault_path)
+    try:
+        with open(path, "rb") as f:
+            snapshot = pickle.loads(zlib.decompress(f.read()))
+        if snapshot.get("version") != SNAPSHOT_VERSION or snapshot.get("vault_path") != index.vault_path:
+            logger.info(f"Ignoring outdated index snapshot {path}")
+            return False
+        index.set_state(snapshot["state"])
+    except FileNotFoundError:
+        return False
+    except Exception as e:
+        logger.warning(f"Ignoring unreadable index snapshot {path}: {e}")
+        return False
+
+    index.saved_generation = index.generation
+    logger.info(f"Loaded index snapshot of {index.vault_path} with {len(index)} notes")
+    return True
+
+
+if __name__ == "__main__":
+    import doctest
+
+    doctest.testmod()
@@ -0,0 +1,144 @@
+import os
+import re
+import logging
+from typing import List, Optional, Tuple
+
+from .index import enclosing_heading
+from .scan import find_in_buffer, open_buffer, preview_from_bytes
+
+logger = logging.getLogger(__name__)
+
+HEADING_LINE_PATTERN = re.compile(rb"#{1,6}[ \t]+(.+?)[ \t#]*$")
+# Fenced code blocks, like FENCE_PATTERN of the index but on bytes
+FENCE_BYTES_PATTERN = re.compile(rb"^(```|~~~).*?(?:^\1|\Z)", re.MULTILINE | re.DOTALL)
+
+# Matches located per note, the preview only shows the first one
+MAX_MATCHES = 5
+
+
+class Snippet:
+    """
+    Where a search matched in a note. matches holds (offset, line number)
+    pairs of up to MAX_MATCHES hits, the offsets point into the file's bytes.
+    heading is the title of the heading the first match is under, if any.
+    """
+
+    def __init__(self, matches: List[Tuple[int, int]], preview: str, heading: Optional[str] = None) -> None:
+        self.matches = matches
+        self.preview = preview
+        self.heading = heading
+
+    def describe(self) -> str:
+        """
+        >>> Snippet([(10, 2)], "a test").describe()
+        'Line 2: a test'
+        >>> Snippet([(10, 2), (40, 7)], "a test").describe()
+        'Line 2 (+1 more): a test'
+        >>> Snippet([(i, i) for i in range(1, MAX_MATCHES + 1)], "a test").describe()
+        'Line 1 (+4 or more): a test'
+        >>> Snippet([(10, 2)], "a test", "Intro").describe()
+        'Line 2 [Intro]: a test'
+        """
+        if not self.matches:
+            return self.preview
+        location = f"Line {self.matches[0][1]}"
+        if self.heading:
+            location += f" [{self.heading}]"
+        more = len(self.matches) - 1
+        if more == 0:
+            return f"{location}: {self.preview}"
+        if len(self.matches) >= MAX_MATCHES:
+            return f"{location} (+{more} or more): {self.preview}"
+        return f"{location} (+{more} more): {self.preview}"
+
+
+def heading_before(data, offset: int) -> Optional[str]:
+    """
+    Returns the title of the last heading line starting before offset in a
+    bytes-like buffer, searching backwards so only the lines above the match
+    are looked at. Like in the outline of indexed notes, lines in fenced code
+    blocks are no headings.
+
+    >>> heading_before(b"# Title\\ntext\\n#tag\\n## Part\\nthe match", 30)
+    'Part'
+    >>> heading_before(b"# Setup\\n```bash\\n# install deps\\npip install zebra\\n```", 40)
+    'Setup'
+    >>> heading_before(b"# Title\\ntext\\n#tag", 15)
+    'Title'
+    >>> heading_before(b"no heading", 5) is None
+    True
+    """
+    fences = []
+    if data.find(b"```", 0, offset) != -1 or data.find(b"~~~", 0, offset) != -1:
+        fences = [match.span() for match in FENCE_BYTES_PATTERN.finditer(data, 0, offset)]
+    end = offset
+    while end > 0:
+        newline = data.rfind(b"\n#", 0, end)
+        line_start = newline + 1
+        if newline == -1:
+            if data[:1] != b"#":
+                return None
+            line_start = 0
+        if any(start <= line_start < fence_end for start, fence_end in fences):
+            end = newline
+            continue
+        line_end = data.find(b"\n", line_start)
+        if line_end == -1:
+            line_end = len(data)
+        match = HEADING_LINE_PATTERN.match(bytes(data[line_start:line_end]).rstrip(b"\r"))
+        if match is not None:
+            return match.group(1).decode("utf-8", "ignore")
+        end = newline
+    return None
+
+
+def file_snippet(path: str, search_lower: str, headings: Optional[Tuple[Tuple[int, str], ...]] = None) -> Snippet:
+    """
+    Locates up to MAX_MATCHES matches of search_lower in a note, ignoring
+    case, and previews the first one. The file is read again, which is fine
+    as snippets are only built for the notes shown. headings is the outline
+    of an indexed note, which tells the heading the first match is under
+    without looking through the lines above it.
+
+    >>> file_snippet("test-vault/subdir/Hallo.md", "hallo").describe()
+    'Line 1: I just want to say Hallo'
+    >>> import tempfile
+    >>> with tempfile.NamedTemporaryFile("w", suffix=".md", encoding="utf-8", delete=False) as f:
+    ...     _ = f.write("über über")
+    >>> file_snippet(f.name, "über").matches
+    [(0, 1), (6, 1)]
+    >>> file_snippet(f.name, "über", ((1, "Intro"),)).heading
+    'Intro'
+    >>> os.unlink(f.name)
+    """
+    try:
+        with open_buffer(path) as data:
+            if not search_lower:
+                return Snippet([], preview_from_bytes(data, 0, 0))
+            matches = []
+            match_length = len(search_lower.encode("utf-8"))
+            offset = find_in_buffer(data, search_lower)
+            line = 1
+            previous = 0
+            while offset != -1 and len(matches) < MAX_MATCHES:
+                line += data[previous:offset].count(b"\n")
+                matches.append((offset, line))
+                previous = offset
+                offset = find_in_buffer(data, search_lower, offset + match_length)
+            if not matches:
+                return Snippet([], "")
+            first_offset, first_line = matches[0]
+            if headings is not None:
+                heading = enclosing_heading(headings, first_line)
+            else:
+                heading = heading_before(data, first_offset)
+            return Snippet(matches, preview_from_bytes(data, first_offset, match_length), heading)
+    except Exception as e:
+        logger.warning(f"Could not read file {path} for its snippet: {e}")
+        return Snippet([], "")
+
+
+if __name__ == "__main__":
+    import doctest
+
+    doctest.testmod()
@@ -0,0 +1,213 @@
+import os
+import re
+import json
+import logging
+from typing import Iterator, List, NamedTuple, Optional, Pattern, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Folders never holding notes, besides hidden ones like .obsidian and .trash
+EXCLUDED_DIRECTORIES = {"node_modules"}
+
+
+class ExclusionRules:
+    """
+    The "Excluded files" of a vault, stored by Obsidian as userIgnoreFilters
+    in .obsidian/app.json. A filter is either a path prefix relative to the
+    vault, like "Archive/", or a regular expression written as /pattern/.
+
+    >>> rules = ExclusionRules(["Archive/", "Templates"], ["\\\\.excalidraw\\\\.md$"])
+    >>> rules.excludes("Archive/2020/Old.md"), rules.excludes("Templates.md"), rules.excludes("Drawing.excalidraw.md")
+    (True, True, True)
+    >>> rules.excludes("Notes/Archive.md")
+    False
+    >>> rules.excludes_directory("Archive"), rules.excludes_directory("Notes")
+    (True, False)
+    """
+
+    def __init__(self, prefixes: Optional[List[str]] = None, patterns: Optional[List[str]] = None) -> None:
+        self.prefixes = [prefix for prefix in prefixes or [] if prefix]
+        self.patterns: List[Pattern] = []
+        for pattern in patterns or []:
+            try:
+                self.patterns.append(re.compile(pattern))
+            except re.error as e:
+                logger.warning(f"Ignoring invalid exclusion pattern /{pattern}/: {e}")
+
+    @classmethod
+    def load(cls, vault_path: str) -> "ExclusionRules":
+        """Reads the filters of a vault, a vault without them excludes nothing."""
+        path = os.path.join(vault_path, ".obsidian", "app.json")
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                filters = json.load(f).get("userIgnoreFilters") or []
+        except FileNotFoundError:
+            return cls()
+        except Exception as e:
+            logger.warning(f"Could not read exclusion filters from {path}: {e}")
+            return cls()
+
+        prefixes, patterns = [], []
+        for item in filters:
+            if not isinstance(item, str):
+                continue
+            if len(item) > 1 and item.startswith("/") and item.endswith("/"):
+                patterns.append(item[1:-1])
+            else:
+                prefixes.append(item)
+        return cls(prefixes, patterns)
+
+    def excludes(self, relative_path: str) -> bool:
+        """Tells if a file, given by its path relative to the vault with / as separator, is excluded."""
+        return any(relative_path.startswith(prefix) for prefix in self.prefixes) or any(
+            pattern.search(relative_path) for pattern in self.patterns
+        )
+
+    def excludes_directory(self, relative_path: str) -> bool:
+        """Tells if everything below a folder is excluded, so the walk does not need to enter it."""
+        return self.excludes(relative_path + "/")
+
+    def __bool__(self):
+        return bool(self.prefixes or self.patterns)
+
+
+def relative_to_vault(vault_path: str, path: str) -> str:
+    """
+    >>> relative_to_vault("/vault", "/vault/sub/Note.md")
+    'sub/Note.md'
+    """
+    return os.path.relpath(path, vault_path).replace(os.sep, "/")
+
+
+def is_excluded_directory(vault_path: str, path: str, rules: Optional[ExclusionRules] = None) -> bool:
+    """
+    >>> is_excluded_directory("/vault", "/vault/.trash"), is_excluded_directory("/vault", "/vault/web/node_modules")
+    (True, True)
+    >>> is_excluded_directory("/vault", "/vault/Notes", ExclusionRules(["Archive"]))
+    False
+    """
+    name = os.path.basename(path)
+    if name.startswith(".") or name in EXCLUDED_DIRECTORIES:
+        return True
+    return bool(rules) and rules.excludes_directory(relative_to_vault(vault_path, path))
+
+
+def is_note_path(vault_path: str, path: str, rules: Optional[ExclusionRules] = None) -> bool:
+    """
+    Tells if a path is a note the index should hold. Hidden files, anything
+    below hidden or excluded folders and the vault's excluded files are skipped.
+
+    >>> is_note_path("/vault", "/vault/sub/Note.md")
+    True
+    >>> is_note_path("/vault", "/vault/.trash/Note.md")
+    False
+    >>> is_note_path("/vault", "/vault/sub/Note.txt")
+    False
+    >>> is_note_path("/vault", "/vault/Archive/Note.md", ExclusionRules(["Archive/"]))
+    False
+    """
+    if not path.endswith(".md"):
+        return False
+    relative = relative_to_vault(vault_path, path)
+    if relative.startswith(os.pardir):
+        return False
+    parts = relative.split("/")
+    if any(part.startswith(".") for part in parts) or any(part in EXCLUDED_DIRECTORIES for part in parts[:-1]):
+        return False
+    return not (rules and rules.excludes(relative))
+
+
+class NoteRecord(NamedTuple):
+    path: str
+    size: int
+    mtime_ns: int
+
+
+def _scan_tree(root: str, vault_path: str, rules: Optional[ExclusionRules]) -> Iterator[Tuple[str, List[os.DirEntry]]]:
+    """
+    Yields (folder, DirEntries of its notes) for root and every folder below
+    it that is neither hidden nor excluded, reading each folder with a single
+    os.scandir. Symlinked folders are followed, but every folder is entered
+    only once, which also breaks symlink loops.
+    """
+    try:
+        root_stat = os.stat(root)
+    except OSError as e:
+        logger.warning(f"Could not list {root}: {e}")
+        return
+    relative_root = relative_to_vault(vault_path, root) + "/"
+    if relative_root == "./":
+        relative_root = ""
+    seen = {(root_stat.st_dev, root_stat.st_ino)}
+    # (folder, its path relative to the vault ending with /)
+    stack = [(root, relative_root)]
+    while stack:
+        directory, relative = stack.pop()
+        notes = []
+        try:
+            with os.scandir(directory) as entries:
+                for entry in entries:
+                    name = entry.name
+                    if name.startswith("."):
+                        continue
+                    try:
+                        if entry.is_dir():
+                            if name in EXCLUDED_DIRECTORIES or (rules and rules.excludes_directory(relative + name)):
+                                continue
+                            # The inode of the listing lacks the device, which changes below mount
+                            # points. Folders are few next to notes, so they can afford a stat.
+                            stat = entry.stat()
+                            key = (stat.st_dev, stat.st_ino)
+                            if key in seen:
+                                logger.debug(f"Skipping {entry.path}, it was listed already (symlink loop?)")
+                                continue
+                            seen.add(key)
+                            stack.append((entry.path, relative + name + "/"))
+                        elif name.endswith(".md") and entry.is_file():
+                            if rules and rules.excludes(relative + name):
+                                continue
+                            notes.append(entry)
+                    except OSError:
+                        continue
+        except OSError as e:
+            logger.warning(f"Could not list {directory}: {e}")
+            continue
+        yield directory, notes
+
+
+def iter_directories(root: str, vault_path: Optional[str] = None, rules: Optional[ExclusionRules] = None) -> Iterator[str]:
+    """Yields root and every folder below it that is neither hidden nor excluded."""
+    for directory, _notes in _scan_tree(root, vault_path or root, rules):
+        yield directory
+
+
+def walk_vault(
+    vault_path: str, rules: Optional[ExclusionRules] = None, root: Optional[str] = None
+) -> Iterator[NoteRecord]:
+    """
+    Yields a (path, size, mtime_ns) record for every note in a vault, or only
+    below its folder root, with a single stat per note. Excluded folders are
+    pruned, so nothing below them is ever listed.
+
+    >>> sorted(record.path for record in walk_vault("test-vault"))
+    ['test-vault/Test.md', 'test-vault/Test2.md', 'test-vault/subdir/Hallo.md', 'test-vault/subdir/Test.md']
+    >>> sorted(record.path for record in walk_vault("test-vault", ExclusionRules(["subdir"])))
+    ['test-vault/Test.md', 'test-vault/Test2.md']
+    >>> [record.size for record in walk_vault("test-vault") if record.path.endswith("Hallo.md")]
+    [24]
+    >>> sorted(record.path for record in walk_vault("test-vault", root="test-vault/subdir"))
+    ['test-vault/subdir/Hallo.md', 'test-vault/subdir/Test.md']
+    """
+    for _directory, notes in _scan_tree(root or vault_path, vault_path, rules):
+        for entry in notes:
+            try:
+                stat = entry.stat()
+            except OSError:
+                continue
+            yield NoteRecord(entry.path, stat.st_size, stat.st_mtime_ns)
+
+
+if __name__ == "__main__":
+    import doctest
+
+    doctest.testmod()
@@ -0,0 +1,304 @@
+import os
+import errno
+import struct
+import time
+import select
+import ctypes
+import ctypes.util
+import threading
+import logging
+from typing import Dict, Optional, Tuple
+
+from .index import VaultIndex
+from .walker import is_excluded_directory, iter_directories, walk_vault
+
+logger = logging.getLogger(__name__)
+
+# Values from <sys/inotify.h>
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ONLYDIR = 0x01000000
+IN_ISDIR = 0x40000000
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+
+WATCH_MASK = (
+    IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE | IN_DELETE_SELF | IN_ONLYDIR
+)
+EVENT_HEADER = struct.Struct("iIII")
+
+
+class WatchLimitReached(Exception):
+    pass
+
+
+class Inotify:
+    """
+    Minimal ctypes binding to the Linux inotify API.
+    """
+
+    def __init__(self, libc, fd: int) -> None:
+        self._libc = libc
+        self.fd = fd
+
+    @classmethod
+    def create(cls) -> Optional["Inotify"]:
+        """Returns None where inotify is not available, e.g. on other platforms."""
+        try:
+            libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+            fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        except (OSError, AttributeError):
+            return None
+        if fd < 0:
+            logger.warning(f"inotify_init1 failed: {os.strerror(ctypes.get_errno())}")
+            return None
+        return cls(libc, fd)
+
+    def add_watch(self, path: str) -> int:
+        wd = self._libc.inotify_add_watch(self.fd, os.fsencode(path), WATCH_MASK)
+        if wd < 0:
+            error = ctypes.get_errno()
+            if error == errno.ENOSPC:
+                raise WatchLimitReached(path)
+            raise OSError(error, os.strerror(error), path)
+        return wd
+
+    def rm_watch(self, wd: int) -> None:
+        self._libc.inotify_rm_watch(self.fd, wd)
+
+    def read_events(self):
+        """Yields (wd, mask, name) for every pending event."""
+        try:
+            data = os.read(self.fd, 64 * 1024)
+        except BlockingIOError:
+            return
+        offset = 0
+        while offset + EVENT_HEADER.size <= len(data):
+            wd, mask, _cookie, length = EVENT_HEADER.unpack_from(data, offset)
+            offset += EVENT_HEADER.size
+            name = os.fsdecode(data[offset:offset + length].rstrip(b"\0"))
+            offset += length
+            yield wd, mask, name
+
+    def close(self) -> None:
+        os.close(self.fd)
+
+
+class VaultWatcher:
+    """
+    Keeps vault indexes in sync with the file system.
+
+    Every registered vault is watched with inotify. When the kernel runs out of
+    watches (or inotify is unavailable) the vault falls back to polling the
+    modification times of its folders, which change whenever a file inside is
+    created, renamed or deleted. Edits of existing files do not touch the folder,
+    so polled vaults are fully re-stamped every FULL_REFRESH_POLLS polls.
+    """
+
+    POLL_INTERVAL = 2.0
+    FULL_REFRESH_POLLS = 30
+
+    def __init__(self) -> None:
+        self._inotify = Inotify.create()
+        self._watches: Dict[int, Tuple[VaultIndex, str]] = {}
+        # vault path -> index, folder -> mtime of every folder of a polled vault
+        self._polled: Dict[str, Tuple[VaultIndex, Dict[str, int]]] = {}
+        self._lock = threading.RLock()
+        self._stop = threading.Event()
+        self._polls = 0
+        self._thread = threading.Thread(target=self._run, name="obsidian-watcher", daemon=True)
+
+    def start(self) -> None:
+        self._thread.start()
+
+    def stop(self, timeout: float = 2.0) -> None:
+        self._stop.set()
+        if self._thread.is_alive():
+            self._thread.join(timeout)
+        with self._lock:
+            if self._inotify is not None:
+                self._inotify.close()
+                self._inotify = None
+            self._watches.clear()
+            self._polled.clear()
+
+    def watch(self, index: VaultIndex) -> None:
+        """Starts applying file changes below index.vault_path to the index."""
+        with self._lock:
+            if self._stop.is_set() or self.is_watching(index.vault_path):
+                return
+            if self._inotify is not None:
+                try:
+                    self._add_tree(index, index.vault_path)
+                    logger.info(f"Watching {index.vault_path} with inotify")
+                    return
+                except WatchLimitReached:
+                    logger.warning(f"Out of inotify watches, polling {index.vault_path} instead")
+                    self._drop_watches(index)
+            self._start_polling(index)
+
+    def is_watching(self, vault_path: str) -> bool:
+        with self._lock:
+            return vault_path in self._polled or any(
+                index.vault_path == vault_path for index, _ in self._watches.values()
+            )
+
+    def _add_tree(self, index: VaultIndex, root: str) -> None:
+        for directory in iter_directories(root, index.vault_path, index.exclusions):
+            try:
+                wd = self._inotify.add_watch(directory)
+            except OSError as e:
+                logger.warning(f"Could not watch {directory}: {e}")
+                continue
+            self._watches[wd] = (index, directory)
+
+    def _drop_watches(self, index: VaultIndex, root: Optional[str] = None) -> None:
+        prefix = None if root is None else os.path.join(root, "")
+        for wd, (watched_index, directory) in list(self._watches.items()):
+            if watched_index is not index:
+                continue
+            if prefix is None or directory == root or directory.startswith(prefix):
+                del self._watches[wd]
+                self._inotify.rm_watch(wd)
+
+    def _start_polling(self, index: VaultIndex) -> None:
+        self._polled[index.vault_path] = (index, self._folder_mtimes(index))
+        logger.info(f"Polling {index.vault_path} every {self.POLL_INTERVAL}s")
+
+    @staticmethod
+    def _folder_mtimes(index: VaultIndex) -> Dict[str, int]:
+        mtimes = {}
+        for directory in iter_directories(index.vault_path, index.vault_path, index.exclusions):
+            try:
+                mtimes[directory] = os.stat(directory).st_mtime_ns
+            except OSError:
+                pass
+        return mtimes
+
+    def _run(self) -> None:
+        next_poll = time.monotonic() + self.POLL_INTERVAL
+        while not self._stop.is_set():
+            fd = self._inotify.fd if self._inotify is not None else None
+            timeout = max(0.0, next_poll - time.monotonic())
+            try:
+                if fd is None:
+                    self._stop.wait(timeout)
+                else:
+                    readable, _, _ = select.select([fd], [], [], timeout)
+                    if readable:
+                        with self._lock:
+                            if self._inotify is not None:
+                                self._handle_events()
+                if time.monotonic() >= next_poll and not self._stop.is_set():
+                    next_poll = time.monotonic() + self.POLL_INTERVAL
+                    self._poll()
+            except Exception as e:
+                # The watcher must never take the extension down with it
+                logger.error(f"Error while watching vaults: {e}")
+                self._stop.wait(self.POLL_INTERVAL)
+
+    def _handle_events(self) -> None:
+        for wd, mask, name in self._inotify.read_events():
+            if mask & IN_Q_OVERFLOW:
+                logger.warning("inotify queue overflowed, refreshing watched vaults")
+                for index in {index for index, _ in self._watches.values()}:
+                    index.refresh()
+                continue
+            if mask & IN_IGNORED:
+                self._watches.pop(wd, None)
+                continue
+            watched = self._watches.get(wd)
+            if watched is None:
+                continue
+            index, directory = watched
+            if mask & IN_DELETE_SELF:
+                index.remove_tree(directory)
+                continue
+            path = os.path.join(directory, name)
+            if mask & IN_ISDIR:
+                self._handle_directory_event(index, mask, path, name)
+            elif mask & (IN_DELETE | IN_MOVED_FROM):
+                index.remove_note(path)
+            elif mask & (IN_CREATE | IN_MOVED_TO):
+                index.add_note(path)
+            elif mask & IN_CLOSE_WRITE:
+                index.update_note(path)
+
+    def _handle_directory_event(self, index: VaultIndex, mask: int, path: str, name: str) -> None:
+        if is_excluded_directory(index.vault_path, path, index.exclusions):
+            return
+        if mask & (IN_DELETE | IN_MOVED_FROM):
+            self._drop_watches(index, path)
+            index.remove_tree(path)
+        elif mask & (IN_CREATE | IN_MOVED_TO):
+            try:
+                self._add_tree(index, path)
+            except WatchLimitReached:
+                logger.warning(f"Out of inotify watches, polling {index.vault_path} instead")
+                self._drop_watches(index)
+                self._start_polling(index)
+            # Files may have landed in the folder before its watch existed
+            for record in walk_vault(index.vault_path, index.exclusions, path):
+                index.update_note(record.path, record)
+
+    def _poll(self) -> None:
+        with self._lock:
+            polled = list(self._polled.items())
+        if not polled:
+            return
+        self._polls += 1
+        full_refresh = self._polls % self.FULL_REFRESH_POLLS == 0
+        for vault_path, (index, mtimes) in polled:
+            if full_refresh:
+                index.refresh()
+                current = self._folder_mtimes(index)
+            else:
+                current = self._poll_vault(index, mtimes)
+            with self._lock:
+                if vault_path in self._polled:
+                    self._polled[vault_path] = (index, current)
+
+    def _poll_vault(self, index: VaultIndex, mtimes: Dict[str, int]) -> Dict[str, int]:
+        current = dict(mtimes)
+        for directory, mtime in mtimes.items():
+            try:
+                new_mtime = os.stat(directory).st_mtime_ns
+            except OSError:
+                current.pop(directory, None)
+                index.remove_tree(directory)
+                continue
+            if new_mtime == mtime:
+                continue
+            current[directory] = new_mtime
+            self._rescan_directory(index, directory, current)
+        return current
+
+    def _rescan_directory(self, index: VaultIndex, directory: str, mtimes: Dict[str, int]) -> None:
+        try:
+            names = os.listdir(directory)
+        except OSError:
+            return
+        present = set()
+        for name in names:
+            path = os.path.join(directory, name)
+            if os.path.isdir(path):
+                if not is_excluded_directory(index.vault_path, path, index.exclusions) and path not in mtimes:
+                    for subdirectory in iter_directories(path, index.vault_path, index.exclusions):
+                        try:
+                            mtimes[subdirectory] = os.stat(subdirectory).st_mtime_ns
+                        except OSError:
+                            continue
+                        for note in os.listdir(subdirectory):
+                            index.add_note(os.path.join(subdirectory, note))
+            else:
+                present.add(path)
+                index.update_note(path)
+        for path in index.notes_in_directory(directory):
+            if path not in present:
+                index.remove_note(path)